@@ -3,16 +3,24 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
-from pathlib import Path
-from importlib.metadata import version, PackageNotFoundError
-
 
 __author__ = "Wibowo Arindrarto"
 __contact__ = "contact@arindrarto.dev"
 __homepage__ = "https://github.com/bow/crimson"
-try:
-    __version__ = version(__name__)
-except PackageNotFoundError:
-    __version__ = "0.0.dev0"
 
-del PackageNotFoundError, Path, version
+
+def __getattr__(name: str) -> str:
+    # The version is resolved on first access, since importlib.metadata is
+    # relatively expensive to import for every command line invocation.
+    if name != "__version__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        value = version(__name__)
+    except PackageNotFoundError:
+        value = "0.0.dev0"
+    globals()["__version__"] = value
+
+    return value
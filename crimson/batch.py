@@ -0,0 +1,146 @@
+"""Batch conversion of many tool outputs in one invocation"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+from functools import partial
+from importlib import import_module
+from os import PathLike
+from typing import List, NamedTuple, Optional, TextIO, Tuple, Union
+
+import click
+
+from .utils import get_handle, map_parallel, write_output
+
+__all__ = ["Task", "read_manifest", "run"]
+
+# Mapping of tool names, as used in the subcommands, to their parser modules.
+TOOLS = {
+    "fastqc": "fastqc",
+    "flagstat": "flagstat",
+    "fusioncatcher": "fusioncatcher",
+    "picard": "picard",
+    "samtools-stats": "samtools_stats",
+    "star": "star",
+    "star-fusion": "star_fusion",
+    "vep": "vep",
+}
+
+
+class Task(NamedTuple):
+    """A single conversion in a batch."""
+
+    tool: str
+    input: str
+    output: str
+
+
+def read_manifest(in_data: Union[str, PathLike, TextIO]) -> List[Task]:
+    """Read a batch manifest into a list of tasks.
+
+    The manifest is a tab-separated file with three columns: the tool name, the
+    input path, and the output path. Empty lines and lines starting with ``#``
+    are ignored.
+
+    :param in_data: Input manifest contents.
+    :returns: Tasks in the order they are listed.
+
+    """
+    tasks = []
+    with get_handle(in_data) as src:
+        for lineno, line in enumerate(src, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) != 3:
+                raise click.BadParameter(
+                    f"Line {lineno} of the manifest does not have three columns."
+                )
+            tool, input, output = fields
+            if tool not in TOOLS:
+                raise click.BadParameter(
+                    f"Line {lineno} of the manifest has an unknown tool {tool!r}."
+                )
+            tasks.append(Task(tool, input, output))
+
+    return tasks
+
+
+def run_task(
+    task: Task,
+    fmt: str = "json",
+    compact: bool = False,
+    indent: int = 4,
+    sort_keys: bool = True,
+    json_backend: str = "stdlib",
+) -> Optional[str]:
+    """Convert a single batch task.
+
+    Any error raised while parsing or writing is caught, so that one bad input
+    does not abort the whole batch.
+
+    :param task: Task to run.
+    :param fmt: Output format.
+    :param compact: Whether to write a compact JSON or not.
+    :param indent: Indentation level.
+    :param sort_keys: Whether to sort mapping keys or not.
+    :param json_backend: Name of the JSON backend.
+    :returns: None if the conversion succeeds, or the error message otherwise.
+
+    """
+    try:
+        module = import_module(f".{TOOLS[task.tool]}", __package__)
+        payload = module.parse(task.input)
+        with get_handle(task.output, mode="w") as dst:
+            write_output(
+                payload,
+                dst,
+                fmt=fmt,
+                compact=compact,
+                indent=indent,
+                sort_keys=sort_keys,
+                json_backend=json_backend,
+            )
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+    return None
+
+
+def run(
+    tasks: List[Task],
+    jobs: Optional[int] = None,
+    fmt: str = "json",
+    compact: bool = False,
+    indent: int = 4,
+    sort_keys: bool = True,
+    json_backend: str = "stdlib",
+) -> List[Tuple[Task, str]]:
+    """Run a batch of conversions, optionally across a process pool.
+
+    :param tasks: Tasks to run.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :param fmt: Output format.
+    :param compact: Whether to write a compact JSON or not.
+    :param indent: Indentation level.
+    :param sort_keys: Whether to sort mapping keys or not.
+    :param json_backend: Name of the JSON backend.
+    :returns: Failed tasks, paired with their error messages.
+
+    """
+    func = partial(
+        run_task,
+        fmt=fmt,
+        compact=compact,
+        indent=indent,
+        sort_keys=sort_keys,
+        json_backend=json_backend,
+    )
+
+    return [
+        (task, error)
+        for task, error in zip(tasks, map_parallel(func, tasks, jobs))
+        if error is not None
+    ]
@@ -8,19 +8,38 @@ from typing import Optional, TextIO, cast
 
 import click
 
-from . import __version__
-from . import fastqc as m_fastqc
-from . import flagstat as m_flagstat
-from . import fusioncatcher as m_fusioncatcher
-from . import picard as m_picard
-from . import star as m_star
-from . import star_fusion as m_star_fusion
-from . import vep as m_vep
-from .utils import write_output
+from .utils import (
+    get_handle,
+    get_json_encoder,
+    write_ndjson,
+    write_output,
+    write_yaml_stream,
+)
+
+# Parser modules are imported inside each subcommand, so that an invocation
+# only pays for importing the parser it actually uses.
+
+
+def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> None:
+    """Prints the package version and exits."""
+    if not value or ctx.resilient_parsing:
+        return
+
+    from . import __version__
+
+    click.echo(__version__)
+    ctx.exit()
 
 
 @click.group()
-@click.version_option(__version__, message="%(version)s")
+@click.option(
+    "--version",
+    is_flag=True,
+    expose_value=False,
+    is_eager=True,
+    callback=print_version,
+    help="Show the version and exit.",
+)
 @click.option(
     "--fmt",
     default="json",
@@ -38,25 +57,135 @@ from .utils import write_output
     help="Whether to create a compact JSON or not. Ignored if output format is"
     " YAML.",
 )
+@click.option(
+    "--sort-keys/--no-sort-keys",
+    default=True,
+    help="Whether to sort mapping keys in the output or not. Default: sorted.",
+)
+@click.option(
+    "--json-backend",
+    default="stdlib",
+    type=click.Choice(["stdlib", "orjson", "auto"]),
+    help="JSON encoder to use. 'orjson' is faster but may format floats"
+    " differently. 'auto' uses orjson if it is installed. Default: stdlib.",
+)
 @click.pass_context
-def main(ctx: click.Context, fmt: str, indent: int, compact: bool) -> None:
+def main(
+    ctx: click.Context,
+    fmt: str,
+    indent: int,
+    compact: bool,
+    sort_keys: bool,
+    json_backend: str,
+) -> None:
     """Converts bioinformatics tools' output to a standard format."""
+    try:
+        get_json_encoder(json_backend)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--json-backend'")
+
     ctx.params["fmt"] = fmt
     ctx.params["indent"] = indent
     ctx.params["compact"] = compact
+    ctx.params["sort_keys"] = sort_keys
+    ctx.params["json_backend"] = json_backend
+
+
+@main.command()
+@click.argument("manifest", type=click.File("r"))
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes. Default: 1.",
+)
+@click.pass_context
+def batch(ctx: click.Context, manifest: TextIO, jobs: int) -> None:
+    """Converts many outputs listed in a manifest.
+
+    The manifest is a tab-separated file of tool name, input path, and output
+    path. Tool names are the same as the subcommand names. Failed conversions
+    are reported at the end without stopping the rest of the batch.
+
+    Use "-" to read the manifest from stdin.
+
+    """
+    from . import batch as m_batch
+
+    tasks = m_batch.read_manifest(manifest)
+    parent = cast(click.Context, ctx.parent)
+    failures = m_batch.run(tasks, jobs, **parent.params)
+
+    click.echo(
+        f"Converted {len(tasks) - len(failures)} of {len(tasks)} file(s).", err=True
+    )
+    for task, error in failures:
+        click.echo(f"Failed: {task.tool} {task.input}: {error}", err=True)
+    if failures:
+        ctx.exit(1)
 
 
 @main.command()
 @click.argument("input", type=click.Path(exists=True, path_type=str))
 @click.argument("output", type=click.File("w"), default="-")
+@click.option(
+    "--modules",
+    default=None,
+    help="Comma-separated names of the modules to parse, e.g."
+    " 'Basic Statistics,Per base sequence quality'. Default: all modules.",
+)
+@click.option(
+    "--many",
+    is_flag=True,
+    default=False,
+    help="Parse every zipped (<sample>_fastqc.zip) and extracted"
+    " (<sample>_fastqc/) FastQC result in the INPUT directory, keyed by sample"
+    " name.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes used with --many. Default: 1.",
+)
+@click.option(
+    "--columnar",
+    is_flag=True,
+    default=False,
+    help="Write each module table as a mapping of column names to column values"
+    " instead of as a list of rows.",
+)
 @click.pass_context
-def fastqc(ctx: click.Context, input: str, output: TextIO) -> None:
+def fastqc(
+    ctx: click.Context,
+    input: str,
+    output: TextIO,
+    modules: Optional[str],
+    many: bool,
+    jobs: int,
+    columnar: bool,
+) -> None:
     """Converts FastQC output.
 
     Use "-" for stdin and/or stdout.
 
     """
-    payload = m_fastqc.parse(Path(input))
+    from . import fastqc as m_fastqc
+
+    names = None if modules is None else [x.strip() for x in modules.split(",")]
+    payload: dict
+    if many:
+        if not Path(input).is_dir():
+            raise click.BadParameter(
+                "INPUT must be a directory with --many.", param_hint="'INPUT'"
+            )
+        payload = m_fastqc.parse_many(
+            input, jobs=jobs, modules=names, columnar=columnar
+        )
+    else:
+        payload = m_fastqc.parse(Path(input), modules=names, columnar=columnar)
     parent = cast(click.Context, ctx.parent)
     write_output(payload, output, **parent.params)
 
@@ -64,58 +193,191 @@ def fastqc(ctx: click.Context, input: str, output: TextIO) -> None:
 @main.command()
 @click.argument("input", type=click.File("r"))
 @click.argument("output", type=click.File("w"), default="-")
+@click.option(
+    "--cohort",
+    type=click.Choice(["tsv", "json"]),
+    default=None,
+    help="Treat INPUT as a list of flagstat file paths, one per line, and write"
+    " one table of all of them with samples as rows, either as TSV or as JSON"
+    " arrays of counts. Sample names are the file names without their"
+    " extension. The JSON table ignores --fmt.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes used with --cohort. Default: 1.",
+)
 @click.pass_context
-def flagstat(ctx: click.Context, input: TextIO, output: TextIO) -> None:
+def flagstat(
+    ctx: click.Context,
+    input: TextIO,
+    output: TextIO,
+    cohort: Optional[str],
+    jobs: int,
+) -> None:
     """Converts samtools flagstat output.
 
     Use "-" for stdin and/or stdout.
 
     """
-    payload = m_flagstat.parse(input)
+    from . import flagstat as m_flagstat
+
     parent = cast(click.Context, ctx.parent)
-    write_output(payload, output, **parent.params)
+    if cohort is None:
+        payload = m_flagstat.parse(input)
+        write_output(payload, output, **parent.params)
+        return
+
+    paths = [line.strip() for line in input if line.strip()]
+    if cohort == "tsv":
+        m_flagstat.write_tsv(m_flagstat.iter_many(paths, jobs), output)
+        return
+
+    payload = m_flagstat.parse_many(paths, jobs)
+    write_output(payload, output, **{**parent.params, "fmt": "json"})
 
 
 @main.command()
 @click.argument("input", type=click.File("r"))
 @click.argument("output", type=click.File("w"), default="-")
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help="Write each record as a JSON object on its own line as soon as it is"
+    " parsed. Ignores --fmt, --indent, and --compact.",
+)
+@click.option(
+    "--multi-doc",
+    is_flag=True,
+    help="Write each record as its own YAML document as soon as it is parsed."
+    " Ignores --fmt and --compact.",
+)
 @click.pass_context
-def fusioncatcher(ctx: click.Context, input: TextIO, output: TextIO) -> None:
+def fusioncatcher(
+    ctx: click.Context,
+    input: TextIO,
+    output: TextIO,
+    ndjson: bool,
+    multi_doc: bool,
+) -> None:
     """Converts FusionCatcher output.
 
     Use "-" for stdin and/or stdout.
 
     """
-    payload = m_fusioncatcher.parse(input)
+    from . import fusioncatcher as m_fusioncatcher
+
     parent = cast(click.Context, ctx.parent)
+    if ndjson:
+        encode = get_json_encoder(parent.params["json_backend"])
+        records = m_fusioncatcher.iter_records(input)
+        write_ndjson(records, output, parent.params["sort_keys"], encode)
+        return
+    if multi_doc:
+        records = m_fusioncatcher.iter_records(input)
+        indent, sort_keys = parent.params["indent"], parent.params["sort_keys"]
+        write_yaml_stream(records, output, indent, sort_keys)
+        return
+
+    payload = m_fusioncatcher.iter_records(input)
     write_output(payload, output, **parent.params)
 
 
 @main.command()
-@click.argument("input", type=click.File("r"))
+@click.argument("input", type=click.Path(allow_dash=True, path_type=str))
 @click.argument("output", type=click.File("w"), default="-")
 @click.option(
     "--input-linesep",
     default=None,
     type=click.Choice(["posix", "windows"]),
-    help=(
-        "Line separator for input files; used when parsing. Default: native"
-        " value for current operating system."
-    ),
+    help="Ignored; line separators of input files are detected automatically.",
+)
+@click.option(
+    "--histogram",
+    default="rows",
+    type=click.Choice(["rows", "columns", "sparse"]),
+    help="Histogram encoding: one mapping per bin, one array per column, or only"
+    " the nonempty bins plus runs of empty bins as [first bin, number of bins]"
+    " pairs. Default: rows.",
+)
+@click.option(
+    "--prefix",
+    is_flag=True,
+    default=False,
+    help="Treat INPUT as an output prefix of CollectMultipleMetrics and parse"
+    " every <INPUT>.*_metrics file, keyed by metrics class.",
+)
+@click.option(
+    "--cohort",
+    is_flag=True,
+    default=False,
+    help="Treat INPUT as a list of paths to metrics files of the same class, one"
+    " per line, and write their metrics as one table of column arrays, with the"
+    " sample name of each row. Sample names are the file names without their"
+    " extension. Histograms are left out.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes used with --prefix or --cohort. Default: 1.",
 )
 @click.pass_context
 def picard(
     ctx: click.Context,
-    input: TextIO,
+    input: str,
     output: TextIO,
     input_linesep: Optional[str],
+    histogram: str,
+    prefix: bool,
+    cohort: bool,
+    jobs: int,
 ) -> None:
     """Converts Picard metrics output.
 
     Use "-" for stdin and/or stdout.
 
     """
-    payload = m_picard.parse(input, input_linesep)
+    from . import picard as m_picard
+
+    if prefix and cohort:
+        raise click.BadParameter(
+            "cannot be used together with --prefix.", param_hint="'--cohort'"
+        )
+
+    payload: dict
+    if prefix:
+        payload = m_picard.parse_prefix(input, jobs=jobs, histogram=histogram)
+    else:
+        # INPUT may not exist with --prefix, so it is only checked here.
+        input_type = click.Path(exists=True, dir_okay=False, allow_dash=True)
+        input_type.convert(input, None, ctx)
+        if cohort:
+            with get_handle(input) as src:
+                paths = [line.strip() for line in src if line.strip()]
+            payload = m_picard.parse_cohort(paths, jobs)
+        else:
+            payload = m_picard.parse(input, input_linesep, histogram=histogram)
+    parent = cast(click.Context, ctx.parent)
+    write_output(payload, output, **parent.params)
+
+
+@main.command(name="samtools-stats")
+@click.argument("input", type=click.File("r"))
+@click.argument("output", type=click.File("w"), default="-")
+@click.pass_context
+def samtools_stats(ctx: click.Context, input: TextIO, output: TextIO) -> None:
+    """Converts samtools stats output.
+
+    Use "-" for stdin and/or stdout.
+
+    """
+    from . import samtools_stats as m_samtools_stats
+
+    payload = m_samtools_stats.parse(input)
     parent = cast(click.Context, ctx.parent)
     write_output(payload, output, **parent.params)
 
@@ -144,6 +406,8 @@ def star(
     Use "-" for stdin and/or stdout.
 
     """
+    from . import star as m_star
+
     payload = m_star.parse(input, input_linesep)
     parent = cast(click.Context, ctx.parent)
     write_output(payload, output, **parent.params)
@@ -152,15 +416,56 @@ def star(
 @main.command(name="star-fusion")
 @click.argument("input", type=click.File("r"))
 @click.argument("output", type=click.File("w"), default="-")
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help="Write each record as a JSON object on its own line as soon as it is"
+    " parsed. Ignores --fmt, --indent, and --compact.",
+)
+@click.option(
+    "--multi-doc",
+    is_flag=True,
+    help="Write each record as its own YAML document as soon as it is parsed."
+    " Ignores --fmt and --compact.",
+)
+@click.option(
+    "--reads",
+    default="full",
+    type=click.Choice(["full", "compact", "count", "hashed", "none"]),
+    help="How to write the supporting read names of non-abridged outputs: as"
+    " lists, as counts, as digests of each list, or not at all. 'compact' writes"
+    " lists, but holds them in less memory while parsing, which helps when"
+    " writing YAML. Default: full.",
+)
 @click.pass_context
-def star_fusion(ctx: click.Context, input: TextIO, output: TextIO) -> None:
+def star_fusion(
+    ctx: click.Context,
+    input: TextIO,
+    output: TextIO,
+    ndjson: bool,
+    multi_doc: bool,
+    reads: str,
+) -> None:
     """Converts output of STAR-Fusion.
 
     Use "-" for stdin and/or stdout.
 
     """
-    payload = m_star_fusion.parse(input)
+    from . import star_fusion as m_star_fusion
+
     parent = cast(click.Context, ctx.parent)
+    if ndjson:
+        encode = get_json_encoder(parent.params["json_backend"])
+        records = m_star_fusion.iter_records(input, reads)
+        write_ndjson(records, output, parent.params["sort_keys"], encode)
+        return
+    if multi_doc:
+        records = m_star_fusion.iter_records(input, reads)
+        indent, sort_keys = parent.params["indent"], parent.params["sort_keys"]
+        write_yaml_stream(records, output, indent, sort_keys)
+        return
+
+    payload = m_star_fusion.iter_records(input, reads)
     write_output(payload, output, **parent.params)
 
 
@@ -171,10 +476,7 @@ def star_fusion(ctx: click.Context, input: TextIO, output: TextIO) -> None:
     "--input-linesep",
     default=None,
     type=click.Choice(["nt", "posix"]),
-    help=(
-        "Line separator for input files; used when parsing. Default: native"
-        " value for current operating system."
-    ),
+    help="Ignored; line separators of input files are detected automatically.",
 )
 @click.pass_context
 def vep(
@@ -188,6 +490,8 @@ def vep(
     Use "-" for stdin and/or stdout.
 
     """
+    from . import vep as m_vep
+
     payload = m_vep.parse(input)
     parent = cast(click.Context, ctx.parent)
     write_output(payload, output, **parent.params)
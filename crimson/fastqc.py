@@ -3,48 +3,122 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
-from io import StringIO
-from os import PathLike, walk
+from functools import partial
+from io import TextIOBase, TextIOWrapper
+from os import PathLike, fspath, scandir, walk
+from os.path import isdir, join
 from pathlib import Path
-from typing import IO, Any, Dict, List, TextIO, Union, cast
-from zipfile import ZipFile, is_zipfile
+from typing import (
+    IO,
+    Any,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Union,
+    cast,
+)
+from zipfile import BadZipFile, ZipFile
 
 import click
 
-from .utils import convert, get_handle
+from .utils import (
+    as_array,
+    convert,
+    convert_column,
+    convert_rows,
+    get_handle,
+    map_parallel,
+)
 
-__all__ = ["parse"]
+__all__ = ["find_results", "parse", "parse_many"]
 
 _MAX_SIZE = 1024 * 1024 * 10
 _MAX_LINE_SIZE = 1024
 _RESULTS_FNAME = "fastqc_data.txt"
 
-# A module content can be a dictionary (when the module is 'Basic Statistics')
-# or a list of dictionaries (keyed by the column name).
-FastQCModuleContents = Union[Dict[str, Any], List[Dict[str, Any]]]
+# Columns whose values may be ranges of positions, e.g. '10-14'.
+_RANGE_COLUMNS = {"Base", "Position"}
+
+# Modules whose tables are always parsed in columnar mode, since they can have
+# hundreds of thousands of rows.
+_COLUMNAR_MODULES = {"Per tile sequence quality"}
+
+# A module content can be a dictionary (when the module is 'Basic Statistics'),
+# a list of dictionaries (keyed by the column name), or in columnar mode, a
+# dictionary of column values (keyed by the column name).
+FastQCModuleContents = Union[
+    Dict[str, Any], List[Dict[str, Any]], Dict[str, Sequence[Any]]
+]
 
 FastQCModulePayload = Dict[str, Union[str, FastQCModuleContents]]
 
 
 class FastQCModule:
-    """Class representing a FastQC analysis module."""
+    """Class representing a FastQC analysis module.
+
+    The module name and status are parsed when the instance is created, while
+    the module contents are only parsed when first accessed. The raw lines are
+    released afterwards.
+
+    """
 
-    def __init__(self, raw_lines: List[str], end_mark: str = ">>END_MODULE") -> None:
+    __slots__ = (
+        "name",
+        "status",
+        "end_mark",
+        "columnar",
+        "raw_lines",
+        "_contents",
+        "_extra",
+    )
+
+    def __init__(
+        self,
+        raw_lines: List[str],
+        end_mark: str = ">>END_MODULE",
+        columnar: bool = False,
+    ) -> None:
         """Initialize an instance.
 
         :param raw_lines: List of lines in the module.
         :param end_mark: Mark of the end of the module.
+        :param columnar: Whether to parse the module table into a mapping of
+            column names to column values, with numeric columns as arrays,
+            instead of into a list of rows.
 
         """
-        # The values of these will be set by _parse.
-        self.status: str
-        self.name: str
+        # check that the last line is a proper end mark
+        if not raw_lines[-1].startswith(end_mark):
+            raise ValueError(
+                "Module last line does not start with the expected end mark"
+                f" {end_mark!r}"
+            )
 
-        self.extra: Dict[str, Any] = {}
+        # parse name and status from first line
+        tokens = raw_lines[0].strip().split("\t")
+        self.name: str = tokens[0][2:]
+        self.status: str = tokens[-1]
 
-        self.raw_lines = raw_lines
         self.end_mark = end_mark
-        self.contents = self._parse()
+        self.columnar = columnar or self.name in _COLUMNAR_MODULES
+        self.raw_lines: Optional[List[str]] = raw_lines
+        self._contents: Optional[FastQCModuleContents] = None
+        self._extra: Dict[str, Any] = {}
+
+    @property
+    def contents(self) -> FastQCModuleContents:
+        """Parsed module contents."""
+        self._load()
+        return cast(FastQCModuleContents, self._contents)
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        """Additional module values outside of its table."""
+        self._load()
+        return self._extra
 
     @property
     def dict(self) -> FastQCModulePayload:
@@ -55,63 +129,70 @@ class FastQCModule:
             **self.extra,
         }
 
-    def _parse(self) -> FastQCModuleContents:
-        """Common parser for a FastQC module."""
+    def _load(self) -> None:
+        """Parse the raw lines, if not yet parsed, and release them."""
+        if self.raw_lines is not None:
+            self._contents = self._parse(self.raw_lines)
+            self.raw_lines = None
 
-        # Helper function for converting FastQC values that keeps
-        # the "Base" column as strings (since it can be a number
-        # or a strin denoting a range)
-        def fqc_convert(k: str, v: Any) -> Any:
-            if k == "Base":
-                return v
-            return convert(v)
+    def _parse(self, raw_lines: List[str]) -> FastQCModuleContents:
+        """Common parser for a FastQC module.
 
-        # check that the last line is a proper end mark
-        if not self.raw_lines[-1].startswith(self.end_mark):
-            raise ValueError(
-                "Module last line does not start with the expected end mark"
-                f" {self.end_mark!r}"
-            )
+        :param raw_lines: List of lines in the module.
+        :returns: Parsed module contents.
+
+        """
+        # modules without any results, e.g. 'Overrepresented sequences' when
+        # it passes, have no table at all
+        if len(raw_lines) == 2:
+            return {} if self.columnar else []
 
-        # parse name and status from first line
-        tokens = self.raw_lines[0].strip().split("\t")
-        name = tokens[0][2:]
-        self.name = name
-        status = tokens[-1]
-        self.status = status
         # the rest of the lines except the last one
-        lines = []
         if self.name != "Sequence Duplication Levels":
             # and column names from second/third line
-            columns = self.raw_lines[1][1:].strip().split("\t")
-            self._columns = columns
-            for line in self.raw_lines[2:-1]:
-                cols = line.strip().split("\t")
-                lines.append(cols)
+            columns = raw_lines[1][1:].strip().split("\t")
+            body = [line.strip() for line in raw_lines[2:-1]]
         else:
-            extra_k, extra_v = self.raw_lines[1][1:].strip().split("\t")
-            self.extra[extra_k] = convert(extra_v)
-            columns = self.raw_lines[2][1:].strip().split("\t")
-            self._columns = columns
-            for line in self.raw_lines[3:-1]:
-                cols = line.strip().split("\t")
-                lines.append(cols)
+            extra_k, extra_v = raw_lines[1][1:].strip().split("\t")
+            self._extra[extra_k] = convert(extra_v)
+            columns = raw_lines[2][1:].strip().split("\t")
+            body = [line.strip() for line in raw_lines[3:-1]]
+
+        # try to convert numbers appropriately
+        # except for position columns, since FastQC may output them as ranges
+        raw_cols = {idx for idx, col in enumerate(columns) if col in _RANGE_COLUMNS}
+
+        if self.columnar and self.name != "Basic Statistics":
+            # split the whole table at once and slice it into columns, instead
+            # of creating a list for each row
+            n_cols = len(columns)
+            cells = "\t".join(body).split("\t") if body else []
+            if len(cells) != n_cols * len(body):
+                raise ValueError(
+                    f"Module {self.name!r} has rows with an unexpected number of"
+                    " columns"
+                )
+            values = [
+                (
+                    cells[idx::n_cols]
+                    if idx in raw_cols
+                    else convert_column(cells[idx::n_cols])
+                )
+                for idx in range(n_cols)
+            ]
+            return {
+                col: col_values if idx in raw_cols else as_array(col_values)
+                for idx, (col, col_values) in enumerate(zip(columns, values))
+            }
+
+        lines = [line.split("\t") for line in body]
 
         # optional processing for different modules
         if self.name == "Basic Statistics":
             return {k: convert(v) for k, v in lines}
 
-        # try to convert numbers appropriately
-        # except for "Base" column, since FastQC may output it as range
-        return [
-            {k: fqc_convert(k, v) for k, v in zpd}
-            for zpd in [
-                # zip column names and its values ~ each item in array ==
-                # one row
-                zip(columns, [v for v in d])
-                for d in lines
-            ]
-        ]
+        # zip column names and its values ~ each item in array == one row
+        return [dict(zip(columns, d)) for d in convert_rows(lines, raw_cols)]
 
 
 class FastQC:
@@ -120,6 +201,7 @@ class FastQC:
     _mod_names = [
         ">>Basic Statistics",
         ">>Per base sequence quality",
+        ">>Per tile sequence quality",
         ">>Per sequence quality scores",
         ">>Per base sequence content",
         ">>Per base GC content",
@@ -129,6 +211,7 @@ class FastQC:
         ">>Sequence Duplication Levels",
         ">>Overrepresented sequences",
         ">>Kmer Content",
+        ">>Adapter Content",
     ]
 
     _mod_map = {k: k.lstrip(">") for k in _mod_names}
@@ -138,6 +221,8 @@ class FastQC:
         fp: TextIO,
         max_size: int = _MAX_SIZE,
         max_line_size: int = _MAX_LINE_SIZE,
+        modules: Optional[Collection[str]] = None,
+        columnar: bool = False,
     ) -> None:
         """Initialize an instance.
 
@@ -146,6 +231,11 @@ class FastQC:
             10 MiB).
         :param max_line_size: maximum number of bytes read everytime the
             underlying ``readline`` is called (default: 1024).
+        :param modules: names of the modules to parse, e.g. "Basic Statistics";
+            the lines of other modules are skipped without being parsed
+            (default: all modules).
+        :param columnar: whether to parse module tables into mappings of column
+            names to column values (default: False).
 
         """
         self.modules = {}
@@ -165,8 +255,11 @@ class FastQC:
             # parse individual modules
             elif tokens[0] in self._mod_map:
                 attr = self._mod_map[tokens[0]]
-                raw_lines = self._read_module(fp, line)
-                self.modules[attr] = FastQCModule(raw_lines)
+                if modules is not None and attr not in modules:
+                    self._skip_module(fp, line)
+                else:
+                    raw_lines = self._read_module(fp, line)
+                    self.modules[attr] = FastQCModule(raw_lines, columnar=columnar)
 
             line = fp.readline(self._max_line_size)
             read_size += self._max_line_size
@@ -189,6 +282,19 @@ class FastQC:
 
         return raw
 
+    def _skip_module(self, fp: TextIO, line: str) -> None:
+        """Consume the lines of a module without storing them.
+
+        :param fp: open file handle pointing to the FastQC data file
+        :param line: first line in the module
+
+        """
+        while not line.startswith(">>END_MODULE"):
+            line = fp.readline(self._max_line_size)
+
+            if not line:
+                raise ValueError(f"Unexpected end of file in module {line!r}")
+
     @property
     def dict(self) -> Dict[str, Union[str, FastQCModulePayload]]:
         """FastQC data as a dictionary."""
@@ -199,11 +305,33 @@ class FastQC:
         return payload
 
 
+def _open_zip(in_data: Union[str, PathLike, IO]) -> Optional[ZipFile]:
+    """Open the input as a zip archive, or return None if it is not one.
+
+    :param in_data: Path to a file or directory, or an open file handle.
+    :returns: The open archive, or None.
+
+    """
+    if isinstance(in_data, TextIOBase):
+        return None
+    if isinstance(in_data, (str, PathLike)) and isdir(in_data):
+        return None
+
+    try:
+        return ZipFile(cast(Union[str, PathLike, IO[bytes]], in_data))
+    except BadZipFile:
+        if not isinstance(in_data, (str, PathLike)):
+            in_data.seek(0)
+        return None
+
+
 def parse(
     in_data: Union[str, PathLike, IO],
     encoding: str = "utf-8",
     results_fname: str = _RESULTS_FNAME,
     max_size: int = _MAX_SIZE,
+    modules: Optional[Collection[str]] = None,
+    columnar: bool = False,
 ) -> dict:
     """Parses FastQC results into a dictionary.
 
@@ -217,25 +345,37 @@ def parse(
         (default: fastqc_data.txt).
     :param max_size: Maximum allowed size of the FastQC data file (default: 10
         MiB).
+    :param modules: Names of the modules to parse, e.g. "Basic Statistics".
+        Other modules are skipped without being parsed (default: all modules).
+    :param columnar: Whether to parse module tables into mappings of column
+        names to column values instead of into lists of rows. Numeric columns
+        become NumPy arrays, or ``array.array`` if NumPy is not installed
+        (default: False).
     :returns: Parsed FastQC values.
 
     """
-    # Input is zipped FastQC result, extract data file contents into a file-like
-    # handle and parse it.
-    if is_zipfile(in_data):
-        zf = ZipFile(in_data)
-        try:
-            (data_fname,) = [f for f in zf.namelist() if f.endswith(results_fname)]
-        except ValueError:
+    if modules is not None:
+        unknown = set(modules) - set(FastQC._mod_map.values())
+        if unknown:
             raise click.BadParameter(
-                f"File {in_data} contains an unexpected number of"
-                f" files named {results_fname}."
+                f"Unknown FastQC module(s): {', '.join(sorted(unknown))}."
             )
 
-        with zf.open(data_fname) as src:
-            data_contents = src.read(max_size).decode(encoding)
-
-        fq = FastQC(StringIO(data_contents))
+    # Input is zipped FastQC result, stream the data file contents from the
+    # archive and parse it.
+    zf = _open_zip(in_data)
+    if zf is not None:
+        with zf:
+            try:
+                (data_fname,) = [f for f in zf.namelist() if f.endswith(results_fname)]
+            except ValueError:
+                raise click.BadParameter(
+                    f"File {in_data} contains an unexpected number of"
+                    f" files named {results_fname}."
+                )
+
+            with TextIOWrapper(zf.open(data_fname), encoding=encoding) as src:
+                fq = FastQC(src, max_size=max_size, modules=modules, columnar=columnar)
 
         return fq.dict
 
@@ -257,6 +397,85 @@ def parse(
 
     # Input is a fastqc_data.txt file handle or path to it.
     with get_handle(in_data, encoding=encoding) as fh:
-        fq = FastQC(fh, max_size=max_size)
+        fq = FastQC(fh, max_size=max_size, modules=modules, columnar=columnar)
 
         return fq.dict
+
+
+def find_results(
+    directory: Union[str, PathLike], results_fname: str = _RESULTS_FNAME
+) -> Dict[str, str]:
+    """Find the FastQC results in a directory.
+
+    Results are either zipped (``<sample>_fastqc.zip``) or extracted
+    (``<sample>_fastqc/``) FastQC outputs directly inside the directory. When a
+    sample has both, the extracted one is used.
+
+    :param directory: Path to the directory.
+    :param results_fname: Name of the text file produced by FastQC in which all
+        the results are stored (default: fastqc_data.txt).
+    :returns: Path to each result, keyed by sample name and sorted by it.
+
+    """
+    zipped: Dict[str, str] = {}
+    extracted: Dict[str, str] = {}
+    with scandir(fspath(directory)) as entries:
+        for entry in entries:
+            if entry.name.endswith("_fastqc.zip") and entry.is_file():
+                zipped[entry.name[: -len("_fastqc.zip")]] = entry.path
+            elif entry.name.endswith("_fastqc") and entry.is_dir():
+                extracted[entry.name[: -len("_fastqc")]] = join(
+                    entry.path, results_fname
+                )
+
+    found = {**zipped, **extracted}
+
+    return {sample: found[sample] for sample in sorted(found)}
+
+
+def parse_many(
+    directory: Union[str, PathLike],
+    jobs: Optional[int] = None,
+    encoding: str = "utf-8",
+    results_fname: str = _RESULTS_FNAME,
+    max_size: int = _MAX_SIZE,
+    modules: Optional[Collection[str]] = None,
+    columnar: bool = False,
+) -> Dict[str, dict]:
+    """Parses all FastQC results in a directory, optionally in parallel.
+
+    :param directory: Path to a directory containing zipped
+        (``<sample>_fastqc.zip``) and/or extracted (``<sample>_fastqc/``)
+        FastQC results.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :param encoding: Encoding of the input files (default: utf-8).
+    :param results_fname: Name of the text file produced by FastQC in which all
+        the results are stored (default: fastqc_data.txt).
+    :param max_size: Maximum allowed size of each FastQC data file (default: 10
+        MiB).
+    :param modules: Names of the modules to parse, e.g. "Basic Statistics".
+        Other modules are skipped without being parsed (default: all modules).
+    :param columnar: Whether to parse module tables into mappings of column
+        names to column values instead of into lists of rows. Numeric columns
+        become NumPy arrays, or ``array.array`` if NumPy is not installed
+        (default: False).
+    :returns: Parsed FastQC values, keyed by sample name.
+
+    """
+    results = find_results(directory, results_fname)
+    if not results:
+        raise click.BadParameter(
+            f"Cannot find any FastQC results in directory {directory}."
+        )
+
+    func = partial(
+        parse,
+        encoding=encoding,
+        results_fname=results_fname,
+        max_size=max_size,
+        modules=modules,
+        columnar=columnar,
+    )
+
+    return dict(zip(results.keys(), map_parallel(func, list(results.values()), jobs)))
@@ -3,55 +3,167 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
-import re
-from functools import partial
+import json
 from os import PathLike
-from typing import List, Optional, Pattern, TextIO, Union
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import click
 
-from .utils import get_handle
+from .utils import get_handle, get_sample_names, map_parallel
 
-__all__ = ["parse"]
+__all__ = ["iter_many", "parse", "parse_many", "write_tsv"]
 
 
 _MAX_SIZE = 1024 * 10
-_RE_TOTAL = re.compile(r"(\d+) \+ (\d+) in total")
-_RE_DUPLICATES = re.compile(r"(\d+) \+ (\d+) duplicates")
-_RE_SECONDARY = re.compile(r"(\d+) \+ (\d+) secondary")
-_RE_SUPPLEMENTARY = re.compile(r"(\d+) \+ (\d+) suppl[ie]mentary")
-_RE_MAPPED = re.compile(r"(\d+) \+ (\d+) mapped ")
-_RE_PAIRED_SEQ = re.compile(r"(\d+) \+ (\d+) paired in ")
-_RE_READ1 = re.compile(r"(\d+) \+ (\d+) read1")
-_RE_READ2 = re.compile(r"(\d+) \+ (\d+) read2")
-_RE_PAIRED_PROPER = re.compile(r"(\d+) \+ (\d+) properly")
-_RE_PAIRED_BAM = re.compile(r"(\d+) \+ (\d+) with itself and")
-_RE_SINGLETON = re.compile(r"(\d+) \+ (\d+) singletons")
-_RE_DIFF = re.compile(r"(\d+) \+ (\d+) with mate mapped to a different chr\s\d")
-_RE_DIFF_MIN = re.compile(r"(\d+) \+ (\d+) with mate mapped to a different chr\s\(")
-
-
-def search(
-    text: str,
-    pattern: Pattern,
-) -> List[Optional[int]]:
-    """Search a text for a pattern and returns the results as integers.
-
-    :param text: Text to search against.
-    :param pattern: Compiled regular expression.
-    :param caster: One-argument function that is applied to each search result.
-    :returns: A list of search results.
+
+# Mapping of flagstat line labels, without their parenthesized annotations, to
+# payload keys.
+_LABELS = {
+    "in total": "total",
+    "total": "total",
+    "primary": "primary",
+    "secondary": "secondary",
+    "supplementary": "supplementary",
+    # Misspelled by samtools up to version 1.1.
+    "supplimentary": "supplementary",
+    "duplicates": "duplicates",
+    "primary duplicates": "primary_duplicates",
+    "mapped": "mapped",
+    "primary mapped": "primary_mapped",
+    "paired in sequencing": "paired_sequencing",
+    "with itself and mate mapped": "paired",
+    "properly paired": "paired_proper",
+    "read1": "read1",
+    "read2": "read2",
+    "singletons": "singleton",
+    "with mate mapped to a different chr": "diff_chrom",
+}
+
+# Label of the line whose mapping quality annotation distinguishes it from the
+# 'diff_chrom' line.
+_DIFF_CHROM = "with mate mapped to a different chr"
+
+# Payload keys, in the order they appear in the flagstat output.
+_KEYS = (
+    "total",
+    "primary",
+    "secondary",
+    "supplementary",
+    "duplicates",
+    "primary_duplicates",
+    "mapped",
+    "primary_mapped",
+    "paired_sequencing",
+    "read1",
+    "read2",
+    "paired_proper",
+    "paired",
+    "singleton",
+    "diff_chrom",
+    "diff_chrom_mapq",
+)
+
+# Top-level payload keys.
+_QC_KEYS = ("pass_qc", "fail_qc")
+
+# Sections of the JSON output of samtools flagstat.
+_JSON_SECTIONS = (("pass_qc", "QC-passed reads"), ("fail_qc", "QC-failed reads"))
+
+
+def get_key(label: str) -> Optional[str]:
+    """Returns the payload key of a flagstat line label.
+
+    :param label: Label of a flagstat line, e.g. 'mapped (94.62%:-nan%)'.
+    :returns: The payload key, or None if the label is not known or if it
+        labels a percentage.
 
     """
-    search_result = pattern.search(text)
-    if search_result is not None:
-        return [int(x) for x in search_result.groups()]
-    return [None] * pattern.groups
+    label, _, annotation = label.strip().partition(" (")
+    if label == _DIFF_CHROM and annotation.startswith("mapQ"):
+        return "diff_chrom_mapq"
+    return _LABELS.get(label)
+
+
+def scan_lines(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    """Splits text or TSV flagstat lines into their counts and labels.
+
+    Text lines look like '<pass> + <fail> <label>', while TSV lines look like
+    '<pass>\\t<fail>\\t<label>'. Lines in neither form are skipped.
+
+    :param lines: Lines of a flagstat output.
+    :returns: An iterator of QC-passed count, QC-failed count, and label.
+
+    """
+    for line in lines:
+        if "\t" in line:
+            fields = line.split("\t", 2)
+            if len(fields) == 3:
+                yield fields[0], fields[1], fields[2]
+        else:
+            fields = line.split(" ", 3)
+            if len(fields) == 4 and fields[1] == "+":
+                yield fields[0], fields[2], fields[3]
+
+
+def parse_text(contents: str) -> Dict[str, Dict[str, int]]:
+    """Parses the default or TSV flagstat output in a single pass.
+
+    :param contents: Flagstat output.
+    :returns: Parsed flagstat values.
+
+    """
+    pass_qc: Dict[str, int] = {}
+    fail_qc: Dict[str, int] = {}
+    for n_pass, n_fail, label in scan_lines(contents.splitlines()):
+        key = get_key(label)
+        if key is None or not n_pass.isdigit() or not n_fail.isdigit():
+            continue
+        pass_qc.setdefault(key, int(n_pass))
+        fail_qc.setdefault(key, int(n_fail))
+
+    return {"pass_qc": pass_qc, "fail_qc": fail_qc}
+
+
+def parse_json(contents: str) -> Dict[str, Dict[str, int]]:
+    """Parses the JSON flagstat output of samtools 1.13 or newer.
+
+    :param contents: Flagstat output.
+    :returns: Parsed flagstat values.
+
+    """
+    try:
+        raw = json.loads(contents)
+    except ValueError:
+        raise click.BadParameter("Cannot parse input flagstat file.")
+
+    payload: Dict[str, Dict[str, int]] = {}
+    for key, section in _JSON_SECTIONS:
+        payload[key] = {}
+        if not isinstance(raw, dict) or not isinstance(raw.get(section), dict):
+            continue
+        for label, value in raw[section].items():
+            name = get_key(label)
+            if name is not None and isinstance(value, int):
+                payload[key].setdefault(name, value)
+
+    return payload
 
 
 def parse(in_data: Union[str, PathLike, TextIO], max_size: int = _MAX_SIZE) -> dict:
     """Parse a samtools flagstat result into a dictionary.
 
+    The default output format, as well as the TSV (``-O tsv``) and JSON (``-O
+    json``) formats of newer samtools versions, are supported.
+
     :param in_data: Input flagstat contents.
     :param max_size: Maximum allowed size of the flagstat file (default: 10
         KiB).
@@ -61,27 +173,89 @@ def parse(in_data: Union[str, PathLike, TextIO], max_size: int = _MAX_SIZE) -> d
     with get_handle(in_data) as fh:
         contents = fh.read(max_size)
 
-    f = partial(search, contents)
-    parsed = (
-        ("total", f(_RE_TOTAL)),
-        ("duplicates", f(_RE_DUPLICATES)),
-        ("secondary", f(_RE_SECONDARY)),
-        ("supplementary", f(_RE_SUPPLEMENTARY)),
-        ("mapped", f(_RE_MAPPED)),
-        ("paired_sequencing", f(_RE_PAIRED_SEQ)),
-        ("paired", f(_RE_PAIRED_BAM)),
-        ("paired_proper", f(_RE_PAIRED_PROPER)),
-        ("read1", f(_RE_READ1)),
-        ("read2", f(_RE_READ2)),
-        ("singleton", f(_RE_SINGLETON)),
-        ("diff_chrom", f(_RE_DIFF)),
-        ("diff_chrom_mapq", f(_RE_DIFF_MIN)),
-    )
-    payload = {
-        "pass_qc": {k: v[0] for k, v in parsed if v[0] is not None},
-        "fail_qc": {k: v[1] for k, v in parsed if v[1] is not None},
-    }
+    if contents.lstrip().startswith("{"):
+        payload = parse_json(contents)
+    else:
+        payload = parse_text(contents)
+
     if len(payload["pass_qc"]) == 0 and len(payload["fail_qc"]) == 0:
         raise click.BadParameter("Cannot parse input flagstat file.")
 
     return payload
+
+
+def _parse_sample(path: Union[str, PathLike]) -> dict:
+    """Parses a flagstat file, adding its path to any parsing error."""
+    try:
+        return parse(path)
+    except click.BadParameter as e:
+        raise click.BadParameter(f"{path}: {e.message}")
+
+
+def iter_many(
+    inputs: Sequence[Union[str, PathLike]],
+    jobs: Optional[int] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """Parses many flagstat files, optionally in parallel.
+
+    Results are yielded in the order of the inputs, as soon as they are parsed.
+
+    :param inputs: Paths to flagstat files.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :returns: An iterator of sample names and parsed flagstat values.
+
+    """
+    samples = get_sample_names(inputs)
+
+    return zip(samples, map_parallel(_parse_sample, inputs, jobs))
+
+
+def parse_many(
+    inputs: Sequence[Union[str, PathLike]],
+    jobs: Optional[int] = None,
+) -> dict:
+    """Parses many flagstat files into one columnar table.
+
+    The table has one row per sample. Each count is a column, stored as a list
+    of integers parallel to the sample names, with None for counts missing from
+    a sample. For example, ``payload["pass_qc"]["mapped"][i]`` is the number
+    of QC-passed mapped reads of ``payload["sample"][i]``.
+
+    :param inputs: Paths to flagstat files.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :returns: Sample names and flagstat values of all inputs.
+
+    """
+    payload: dict = {
+        "sample": [],
+        **{qc: {key: [] for key in _KEYS} for qc in _QC_KEYS},
+    }
+    for sample, parsed in iter_many(inputs, jobs):
+        payload["sample"].append(sample)
+        for qc in _QC_KEYS:
+            for key, values in payload[qc].items():
+                values.append(parsed[qc].get(key))
+
+    return payload
+
+
+def write_tsv(records: Iterable[Tuple[str, dict]], out_handle: TextIO) -> None:
+    """Writes parsed flagstat values as a table, one sample per row.
+
+    Each row is written as soon as it is produced, so the records may be a
+    generator of arbitrary length, such as the one returned by
+    :func:`iter_many`. Missing counts are written as empty cells.
+
+    :param records: Sample names and their parsed flagstat values.
+    :param out_handle: Output handle.
+
+    """
+    header = ["sample"] + [f"{qc}.{key}" for qc in _QC_KEYS for key in _KEYS]
+    out_handle.write("\t".join(header) + "\n")
+    for sample, parsed in records:
+        row = [sample] + [
+            str(parsed[qc].get(key, "")) for qc in _QC_KEYS for key in _KEYS
+        ]
+        out_handle.write("\t".join(row) + "\n")
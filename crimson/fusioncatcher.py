@@ -3,14 +3,15 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
+from functools import lru_cache
 from os import PathLike
-from typing import Dict, List, TextIO, Union
+from typing import Callable, Dict, Iterator, List, TextIO, Tuple, Union
 
 import click
 
 from .utils import get_handle
 
-__all__ = ["parse"]
+__all__ = ["iter_records", "parse"]
 
 # Expected column names
 _COLS = {
@@ -119,6 +120,112 @@ def split_filter(string: str, delim: str) -> List[str]:
     return string.split(delim)
 
 
+# Column format versions, keyed by their column names
+_FORMATS = {tuple(colnames): version for version, colnames in _COLS.items()}
+
+# Columns that every data line must have
+_REQUIRED = _COLS["1.00"]
+
+
+@lru_cache(maxsize=None)
+def compile_decoder(colnames: Tuple[str, ...]) -> Callable[[str], dict]:
+    """Return a function that decodes a line with the given columns.
+
+    The column indices and the optional columns present only depend on the
+    column names, so they are resolved once here instead of for every line.
+
+    :param colnames: Column names present in the file.
+
+    """
+    n_cols = len(colnames)
+    # Column names present twice refer to their last occurrence.
+    idx = {colname: i for i, colname in enumerate(colnames)}
+    missing = [colname for colname in _REQUIRED if colname not in idx]
+    transcripts_idx = idx.get("Predicted_fused_transcripts")
+    proteins_idx = idx.get("Predicted_fused_proteins")
+
+    if missing:
+
+        def decode_missing(raw_line: str) -> dict:
+            values = raw_line.split("\t")
+            if len(values) != n_cols:
+                msg = "Line values {0} does not match column names {1}."
+                raise click.BadParameter(msg.format(values, list(colnames)))
+            msg = "Column names {0} do not contain {1}."
+            raise click.BadParameter(msg.format(list(colnames), missing))
+
+        return decode_missing
+
+    (
+        sym5,
+        sym3,
+        desc,
+        n_common,
+        n_pairs,
+        n_unique,
+        anchor,
+        method,
+        point5,
+        point3,
+        gid5,
+        gid3,
+        exon5,
+        exon3,
+        seq,
+        effect,
+    ) = (idx[colname] for colname in _REQUIRED)
+
+    def decode(raw_line: str) -> dict:
+        values = raw_line.split("\t")
+        if len(values) != n_cols:
+            msg = "Line values {0} does not match column names {1}."
+            raise click.BadParameter(msg.format(values, list(colnames)))
+
+        f5 = values[point5].strip().split(_DELIM["loc"])
+        f3 = values[point3].strip().split(_DELIM["loc"])
+
+        res = {
+            "5end": {
+                "geneSymbol": values[sym5].strip(),
+                "geneID": values[gid5].strip(),
+                "exonID": values[exon5].strip() or None,
+                "chromosome": f5[0],
+                "position": int(f5[1]),
+                "strand": f5[2],
+            },
+            "3end": {
+                "geneSymbol": values[sym3].strip(),
+                "geneID": values[gid3].strip(),
+                "exonID": values[exon3].strip() or None,
+                "chromosome": f3[0],
+                "position": int(f3[1]),
+                "strand": f3[2],
+            },
+            "fusionDescription": split_filter(values[desc].strip(), _DELIM["desc"]),
+            "nCommonMappingReads": int(values[n_common]),
+            "nSpanningPairs": int(values[n_pairs]),
+            "nSpanningUniqueReads": int(values[n_unique]),
+            "longestAnchorLength": int(values[anchor]),
+            "fusionFindingMethod": split_filter(values[method].strip(), _DELIM["gen"]),
+            "fusionSequence": values[seq].strip(),
+            "predictedEffect": values[effect].strip(),
+        }
+
+        # Optional columns of some formats
+        if transcripts_idx is not None:
+            res["predictedFusedTranscripts"] = split_filter(
+                values[transcripts_idx].strip(), _DELIM["gen"]
+            )
+        if proteins_idx is not None:
+            res["predictedFusedProteins"] = split_filter(
+                values[proteins_idx].strip(), _DELIM["gen"]
+            )
+
+        return res
+
+    return decode
+
+
 def parse_raw_line(raw_line: str, colnames: List[str]) -> dict:
     """Parse a single line into a dictionary.
 
@@ -126,75 +233,45 @@ def parse_raw_line(raw_line: str, colnames: List[str]) -> dict:
     :param colnames: Column names present in the file.
 
     """
-    values = raw_line.split("\t")
-    if len(values) != len(colnames):
-        msg = "Line values {0} does not match column names {1}."
-        raise click.BadParameter(msg.format(values, colnames))
-
-    d = {k: v.strip() for k, v in zip(colnames, values)}
-
-    f5 = d["Fusion_point_for_gene_1(5end_fusion_partner)"].split(_DELIM["loc"])
-    f3 = d["Fusion_point_for_gene_2(3end_fusion_partner)"].split(_DELIM["loc"])
-
-    res = {
-        "5end": {
-            "geneSymbol": d["Gene_1_symbol(5end_fusion_partner)"],
-            "geneID": d["Gene_1_id(5end_fusion_partner)"],
-            "exonID": d["Exon_1_id(5end_fusion_partner)"] or None,
-            "chromosome": f5[0],
-            "position": int(f5[1]),
-            "strand": f5[2],
-        },
-        "3end": {
-            "geneSymbol": d["Gene_2_symbol(3end_fusion_partner)"],
-            "geneID": d["Gene_2_id(3end_fusion_partner)"],
-            "exonID": d["Exon_2_id(3end_fusion_partner)"] or None,
-            "chromosome": f3[0],
-            "position": int(f3[1]),
-            "strand": f3[2],
-        },
-        "fusionDescription": split_filter(d["Fusion_description"], _DELIM["desc"]),
-        "nCommonMappingReads": int(d["Counts_of_common_mapping_reads"]),
-        "nSpanningPairs": int(d["Spanning_pairs"]),
-        "nSpanningUniqueReads": int(d["Spanning_unique_reads"]),
-        "longestAnchorLength": int(d["Longest_anchor_found"]),
-        "fusionFindingMethod": split_filter(d["Fusion_finding_method"], _DELIM["gen"]),
-        "fusionSequence": d["Fusion_sequence"],
-        "predictedEffect": d["Predicted_effect"],
-    }
+    return compile_decoder(tuple(colnames))(raw_line)
+
+
+def detect_format(colnames: List[str]) -> str:
+    """Return the detected column format version.
 
-    # Does predicted_fused_transcripts exist for the column format
-    if "Predicted_fused_transcripts" in d:
-        FusedTranscripts = split_filter(d["Predicted_fused_transcripts"], _DELIM["gen"])
-        res["predictedFusedTranscripts"] = FusedTranscripts
+    :param colnames: Column names present in the file.
 
-    if "Predicted_fused_proteins" in d:
-        FusedProteins = split_filter(d["Predicted_fused_proteins"], _DELIM["gen"])
-        res["predictedFusedProteins"] = FusedProteins
+    """
+    version = _FORMATS.get(tuple(colnames))
+    if version is None:
+        msg = "Unexpected column names: {0}."
+        raise click.BadParameter(msg.format(colnames))
+    return version
 
-    return res
 
+def iter_records(in_data: Union[str, PathLike, TextIO]) -> Iterator[dict]:
+    """Yield the records of a FusionCatcher output one line at a time.
 
-def parse(in_data: Union[str, PathLike, TextIO]) -> List[dict]:
-    """Parse the abridged output of a FusionCatcher run.
+    Unlike :func:`parse`, only the record being parsed is kept in memory.
 
     :param in_data: Input FusionCatcher contents.
-    :returns: Parsed values.
 
     """
-    payload = []
     with get_handle(in_data) as src:
         first_line = src.readline().strip()
         # Parse column names
         colnames = first_line.split("\t")
+        version = detect_format(colnames)
+        decode = compile_decoder(tuple(_COLS[version]))
+        for line in src:
+            yield decode(line)
 
-        # If none of the colnames are recognised
-        if not any(colnames == cols for cols in _COLS.values()):
-            msg = "Unexpected column names: {0}."
-            raise click.BadParameter(msg.format(colnames))
 
-        for line in src:
-            parsed = parse_raw_line(line, colnames)
-            payload.append(parsed)
+def parse(in_data: Union[str, PathLike, TextIO]) -> List[dict]:
+    """Parse the abridged output of a FusionCatcher run.
+
+    :param in_data: Input FusionCatcher contents.
+    :returns: Parsed values.
 
-    return payload
+    """
+    return list(iter_records(in_data))
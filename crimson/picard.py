@@ -3,59 +3,281 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
+import glob
 import os
 import re
-from typing import Any, Dict, Optional, TextIO, Union
+from functools import partial
+from itertools import chain, islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+    cast,
+)
 
 import click
 
-from .utils import convert, get_handle, get_linesep
+from .utils import (
+    as_array,
+    convert,
+    convert_rows,
+    get_handle,
+    get_sample_names,
+    map_parallel,
+)
 
-_MAX_SIZE = 1024 * 1024 * 1
 _RE_HEADER = re.compile(r"^#+\s+")
 
+# Number of table rows whose values are converted together.
+_CHUNK_SIZE = 4096
 
-__all__ = ["parse"]
 
+__all__ = [
+    "densify_histogram",
+    "find_prefix",
+    "parse",
+    "parse_cohort",
+    "parse_prefix",
+]
 
-def parse_header(header: str, linesep: str) -> Dict[str, str]:
+
+def _iter_lines(
+    section: Union[str, Iterable[str]],
+    linesep: Optional[str] = None,
+) -> Iterator[str]:
+    """Yields the lines of a section, without their line separators.
+
+    :param section: Raw section string, or its lines.
+    :param linesep: Line separator characters of a raw section string. If None,
+        any line separator is recognized.
+
+    """
+    if isinstance(section, str):
+        section = section.split(linesep) if linesep else section.splitlines()
+    for line in section:
+        yield line.rstrip("\r\n")
+
+
+def _iter_chunks(lines: Iterator[str]) -> Iterator[List[Sequence[Any]]]:
+    """Yields converted table rows in chunks.
+
+    Values are converted in chunks of rows, so that only the raw values of one
+    chunk are kept in memory at a time.
+
+    :param lines: Table lines, without the header.
+
+    """
+    while True:
+        chunk = [line.split("\t") for line in islice(lines, _CHUNK_SIZE)]
+        if not chunk:
+            return
+        yield convert_rows(chunk)
+
+
+def _parse_rows(header_cols: List[Any], lines: Iterator[str]) -> List[dict]:
+    """Parses table lines into dictionaries keyed by the header columns.
+
+    :param header_cols: Converted header columns.
+    :param lines: Table lines, without the header.
+
+    """
+    contents: List[dict] = []
+    for chunk in _iter_chunks(lines):
+        contents.extend(dict(zip(header_cols, row)) for row in chunk)
+
+    return contents
+
+
+def _parse_columns(header_cols: List[Any], lines: Iterator[str]) -> dict:
+    """Parses table lines into columns keyed by the header columns.
+
+    Columns of only ints or only floats are stored as arrays, see
+    :func:`.utils.as_array`. Columns of mixed types are kept as lists, so that
+    their values keep their types.
+
+    :param header_cols: Converted header columns.
+    :param lines: Table lines, without the header.
+
+    """
+    n_cols = len(header_cols)
+    columns: List[List[Any]] = [[] for _ in header_cols]
+    for chunk in _iter_chunks(lines):
+        if any(len(row) != n_cols for row in chunk):
+            raise click.BadParameter(
+                "Histogram rows do not have the same columns as its header."
+            )
+        for column, values in zip(columns, zip(*chunk)):
+            column.extend(values)
+
+    return {
+        name: as_array(column) if len(set(map(type, column))) == 1 else column
+        for name, column in zip(header_cols, columns)
+    }
+
+
+def _parse_sparse(header_cols: List[Any], lines: Iterator[str]) -> dict:
+    """Parses table lines into rows without the runs of empty bins.
+
+    A row is dropped if all its values other than the first one, the bin, are
+    int zeros. Dropped rows with consecutive bins are stored as a run of their
+    first bin and their number. Rows are only dropped while the bins are
+    ascending ints, as in every Picard histogram, so that their positions
+    can be restored from their bins. Otherwise, all rows are kept.
+
+    :param header_cols: Converted header columns.
+    :param lines: Table lines, without the header.
+
+    """
+    payload: dict = {"columns": header_cols, "rows": [], "zero_runs": []}
+    rows, zero_runs = payload["rows"], payload["zero_runs"]
+    prev_bin: Any = None
+    in_run = False
+    ascending = True
+    for chunk in _iter_chunks(lines):
+        for row in chunk:
+            bin_value, counts = row[0], row[1:]
+            if ascending and (
+                type(bin_value) is not int
+                or (prev_bin is not None and bin_value <= prev_bin)
+            ):
+                # Put the dropped rows back, since their positions can no
+                # longer be told from their bins.
+                ascending = False
+                rows[:] = [list(dense.values()) for dense in densify_histogram(payload)]
+                zero_runs.clear()
+            if ascending and not any(counts) and all(type(c) is int for c in counts):
+                if in_run and bin_value == prev_bin + 1:
+                    zero_runs[-1][1] += 1
+                else:
+                    zero_runs.append([bin_value, 1])
+                in_run = True
+            else:
+                rows.append(list(row))
+                in_run = False
+            prev_bin = bin_value
+
+    return payload
+
+
+# Histogram parsers, keyed by the histogram encoding.
+_HISTOGRAM_PARSERS: Dict[str, Callable[[List[Any], Iterator[str]], Any]] = {
+    "rows": _parse_rows,
+    "columns": _parse_columns,
+    "sparse": _parse_sparse,
+}
+
+
+def _get_histogram_parser(
+    encoding: str,
+) -> Callable[[List[Any], Iterator[str]], Any]:
+    """Returns the histogram parser of an encoding, see :func:`parse`."""
+    try:
+        return _HISTOGRAM_PARSERS[encoding]
+    except KeyError:
+        msg = "Unknown histogram encoding {0!r}; expected one of {1}."
+        raise click.BadParameter(msg.format(encoding, ", ".join(_HISTOGRAM_PARSERS)))
+
+
+def densify_histogram(contents: Union[List[dict], dict]) -> List[dict]:
+    """Returns the histogram contents in the default encoding, one dictionary
+    per bin.
+
+    :param contents: Histogram contents in any encoding, see :func:`parse`.
+    :returns: Histogram contents, equal to those parsed with the default
+        encoding.
+
+    """
+    if isinstance(contents, list):
+        return contents
+
+    if "zero_runs" not in contents:
+        columns = [
+            column.tolist() if hasattr(column, "tolist") else column
+            for column in contents.values()
+        ]
+        return [dict(zip(contents, row)) for row in zip(*columns)]
+
+    header_cols = contents["columns"]
+    n_counts = len(header_cols) - 1
+    dense: List[dict] = []
+    rows = iter(contents["rows"])
+    row = next(rows, None)
+    for first_bin, n_bins in contents["zero_runs"]:
+        while row is not None and (type(row[0]) is not int or row[0] < first_bin):
+            dense.append(dict(zip(header_cols, row)))
+            row = next(rows, None)
+        dense.extend(
+            dict(zip(header_cols, [bin_value] + [0] * n_counts))
+            for bin_value in range(first_bin, first_bin + n_bins)
+        )
+    while row is not None:
+        dense.append(dict(zip(header_cols, row)))
+        row = next(rows, None)
+
+    return dense
+
+
+def parse_header(
+    header: Union[str, Iterable[str]],
+    linesep: Optional[str] = None,
+) -> Dict[str, str]:
     """Parse the Picard header lines into a dictionary.
 
-    :param header: Raw Picard header string.
-    :param linesep: Line separator characters used when parsing.
+    :param header: Raw Picard header string, or its lines.
+    :param linesep: Line separator characters of a raw header string. If None,
+        any line separator is recognized.
 
     """
-    parsed = [_RE_HEADER.sub("", x) for x in header.split(linesep)]
+    parsed = [_RE_HEADER.sub("", x) for x in _iter_lines(header, linesep)]
     if len(parsed) != 4:
         raise ValueError("Unexpected Picard header.")
 
     return {"flags": parsed[1], "time": parsed[3]}
 
 
-def parse_metrics(metrics: Optional[str], linesep: str) -> Optional[dict]:
-    """Parse the Picard metrics lines into a dictionary.
+def _split_metrics(lines: Iterator[str]) -> Tuple[Optional[str], List[Any]]:
+    """Reads the class and the header columns of a metrics section.
 
-    :param metris: Raw Picard metrics string.
-    :param linesep: Line separator characters used when parsing.
+    :param lines: Metrics section lines, which are left at the first row.
+    :returns: The metrics class, if any, and the converted header columns.
 
     """
-    if metrics is None:
-        return None
-
-    lines = [line.strip(linesep) for line in metrics.split(linesep)]
-
     metrics_class: Optional[str]
     try:
-        metrics_class = lines.pop(0).split("\t")[1]
+        metrics_class = next(lines, "").split("\t")[1]
     except IndexError:
         metrics_class = None
 
-    parsed = []
-    for line in lines:
-        parsed.append([convert(v) for v in line.split("\t")])
+    header_cols = [convert(v) for v in next(lines, "").split("\t")]
+
+    return metrics_class, header_cols
+
+
+def parse_metrics(
+    metrics: Union[str, Iterable[str], None],
+    linesep: Optional[str] = None,
+) -> Optional[dict]:
+    """Parse the Picard metrics lines into a dictionary.
 
-    header_cols = parsed.pop(0)
-    contents: Any = [dict(zip(header_cols, line)) for line in parsed]
+    :param metrics: Raw Picard metrics string, or its lines.
+    :param linesep: Line separator characters of a raw metrics string. If None,
+        any line separator is recognized.
+
+    """
+    if metrics is None:
+        return None
+
+    lines = _iter_lines(metrics, linesep)
+    metrics_class, header_cols = _split_metrics(lines)
+    contents: Any = _parse_rows(header_cols, lines)
     if len(contents) == 1:
         contents = contents.pop()
     payload: dict = {"contents": contents}
@@ -65,58 +287,263 @@ def parse_metrics(metrics: Optional[str], linesep: str) -> Optional[dict]:
     return payload
 
 
-def parse_histogram(histo: Optional[str], linesep: str) -> Optional[dict]:
+def parse_histogram(
+    histo: Union[str, Iterable[str], None],
+    linesep: Optional[str] = None,
+    encoding: str = "rows",
+) -> Optional[dict]:
     """Parse the Picard histogram lines into a dictionary.
 
-    :param metris: Raw Picard histogram string.
-    :param linesep: Line separator characters used when parsing.
+    :param histo: Raw Picard histogram string, or its lines.
+    :param linesep: Line separator characters of a raw histogram string. If
+        None, any line separator is recognized.
+    :param encoding: Encoding of the histogram contents, see :func:`parse`.
 
     """
+    parse_rows = _get_histogram_parser(encoding)
     if histo is None:
         return None
 
-    lines = [line.strip(linesep) for line in histo.split(linesep)]
-    lines.pop(0)
+    lines = _iter_lines(histo, linesep)
+    next(lines, None)
+
+    header_cols = [convert(v) for v in next(lines, "").split("\t")]
+    payload = {"contents": parse_rows(header_cols, lines)}
 
-    parsed = []
+    return payload
+
+
+def _take_section(lines: Iterator[str]) -> Iterator[str]:
+    """Yields lines up to the next empty line, which ends a section."""
     for line in lines:
-        parsed.append([convert(v) for v in line.split("\t")])
+        line = line.rstrip("\r\n")
+        if not line:
+            return
+        yield line
 
-    header_cols = parsed.pop(0)
-    payload = {"contents": [dict(zip(header_cols, line)) for line in parsed]}
 
-    return payload
+def _iter_sections(lines: Iterator[str]) -> Iterator[Tuple[str, Iterator[str]]]:
+    """Yields the first line and all the lines of each section.
+
+    Each section must be consumed before the next one is yielded; lines that
+    are not consumed are skipped.
+
+    :param lines: Lines of a Picard metrics file.
+
+    """
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        section = _take_section(lines)
+        yield line, chain([line], section)
+        for _ in section:
+            pass
 
 
 def parse(
     in_data: Union[str, os.PathLike, TextIO],
     input_linesep: Optional[str] = None,
-    max_size: int = _MAX_SIZE,
+    max_size: Optional[int] = None,
+    histogram: str = "rows",
 ) -> dict:
     """Parse an input Picard metrics file into a dictionary.
 
+    The file is read one line at a time, with each section (header, metrics,
+    and histogram) parsed as soon as it starts. Sections end at an empty
+    line. Both ``\\n`` and ``\\r\\n`` line separators are recognized.
+
+    The histogram contents are encoded depending on ``histogram``:
+
+    * ``rows``: a list of dictionaries, one per bin.
+    * ``columns``: a mapping of column names to column values. Columns of only
+      ints or only floats are NumPy arrays, or ``array.array`` if NumPy is not
+      installed.
+    * ``sparse``: a mapping of the column names (``columns``), the rows that
+      are not empty as lists of values (``rows``), and the runs of
+      consecutive empty bins as pairs of their first bin and their number of
+      bins (``zero_runs``). A bin is empty if all its values other than the
+      bin are zero.
+
+    Contents in any encoding can be turned back into the ``rows`` encoding
+    with :func:`densify_histogram`.
+
     :param in_data: Input metrics file.
-    :param input_linesep: Name of the operating system used for determining
-        input line separator. Valid values are 'nt', 'posix', or None.
-    :param max_size: Maximum allowed size of the Picard metrics file (default:
-        10 MiB).
+    :param input_linesep: Ignored, since line separators are detected
+        automatically. Kept for backwards compatibility.
+    :param max_size: Ignored, since files of any size are parsed. Kept for
+        backwards compatibility.
+    :param histogram: Encoding of the histogram contents.
 
     """
+    _get_histogram_parser(histogram)
+    header = metrics = histo = None
     with get_handle(in_data) as fh:
-        contents = fh.read(max_size)
-
-    linesep = get_linesep(input_linesep)
-    sections = contents.strip(linesep).split(linesep * 2)
+        for line, section in _iter_sections(iter(fh)):
+            if line.startswith("## htsjdk") and header is None:
+                header = parse_header(section)
+            elif line.startswith("## METRICS") and metrics is None:
+                metrics = parse_metrics(section)
+            elif line.startswith("## HISTOGRAM") and histo is None:
+                histo = parse_histogram(section, encoding=histogram)
 
-    header = next((x for x in sections if x.startswith("## htsjdk")), None)
     if header is None:
         raise click.BadParameter("Unexpected Picard metrics file format.")
 
-    metrics = next((x for x in sections if x.startswith("## METRICS")), None)
-    histo = next((x for x in sections if x.startswith("## HISTOGRAM")), None)
+    return {"header": header, "metrics": metrics, "histogram": histo}
+
+
+def _parse_file(path: str, histogram: str = "rows") -> dict:
+    """Parses a Picard metrics file, adding its path to any parsing error."""
+    try:
+        return parse(path, histogram=histogram)
+    except (click.BadParameter, ValueError) as e:
+        message = e.message if isinstance(e, click.BadParameter) else str(e)
+        raise click.BadParameter(f"{path}: {message}")
+
+
+def find_prefix(prefix: str) -> List[str]:
+    """Returns the paths of the metrics files written for an output prefix.
+
+    These are the ``<prefix>.<name>_metrics`` files written by Picard
+    CollectMultipleMetrics, e.g. ``sample.alignment_summary_metrics``. Files
+    of other prefixes that start with the given one, such as
+    ``sample.dedup.alignment_summary_metrics``, are not included.
+
+    :param prefix: Output prefix, e.g. ``path/to/sample``.
+    :returns: Paths of the metrics files, sorted.
+
+    """
+    paths = glob.glob(f"{glob.escape(prefix)}.*_metrics")
+    start = len(prefix) + 1
+
+    return sorted(path for path in paths if "." not in path[start:])
+
+
+def parse_prefix(
+    prefix: str,
+    jobs: Optional[int] = None,
+    histogram: str = "rows",
+) -> Dict[str, dict]:
+    """Parses all metrics files of an output prefix, optionally in parallel.
+
+    Each parsed file is keyed by its metrics class, e.g.
+    ``picard.analysis.AlignmentSummaryMetrics``. Files without a metrics
+    section, such as the histogram-only ``<prefix>.quality_distribution_metrics``,
+    are keyed by their name without the prefix, e.g.
+    ``quality_distribution_metrics``.
+
+    :param prefix: Output prefix, e.g. ``path/to/sample``. See
+        :func:`find_prefix`.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :param histogram: Encoding of the histogram contents, see :func:`parse`.
+    :returns: Parsed Picard metrics values, keyed by metrics class.
+    :raises click.BadParameter: if no metrics file is found, or if two files
+        have the same metrics class.
+
+    """
+    _get_histogram_parser(histogram)
+    paths = find_prefix(prefix)
+    if not paths:
+        raise click.BadParameter(
+            f"Cannot find any Picard metrics files with prefix {prefix}."
+        )
+
+    func = partial(_parse_file, histogram=histogram)
+    start = len(prefix) + 1
+    payload: Dict[str, dict] = {}
+    for path, parsed in zip(paths, map_parallel(func, paths, jobs)):
+        metrics = parsed["metrics"]
+        key = metrics.get("class") if metrics is not None else None
+        if key is None:
+            key = path[start:]
+        if key in payload:
+            raise click.BadParameter(f"Metrics class {key} of {path} is not unique.")
+        payload[key] = parsed
+
+    return payload
+
+
+def _read_metrics_rows(
+    path: Union[str, os.PathLike],
+) -> Tuple[Optional[str], List[Any], List[Sequence[Any]]]:
+    """Reads the metrics section of a file as its class, header, and rows."""
+    with get_handle(path) as fh:
+        for line, section in _iter_sections(iter(fh)):
+            if line.startswith("## METRICS"):
+                metrics_class, header_cols = _split_metrics(section)
+                rows = [row for chunk in _iter_chunks(section) for row in chunk]
+                return metrics_class, header_cols, rows
+
+    raise click.BadParameter(f"{path}: Cannot find a metrics section.")
+
+
+def parse_cohort(
+    inputs: Sequence[Union[str, os.PathLike]],
+    jobs: Optional[int] = None,
+) -> dict:
+    """Parses the metrics of many Picard files of one class into columns.
+
+    The metrics rows of all files are stored as one table, with a single
+    header. Each column is a NumPy array, or ``array.array`` if NumPy is not
+    installed, if all its values are numbers, and a list otherwise. The row
+    index holds the sample name of each row, which is the file name without
+    its last extension. Files with more than one metrics row, such as those
+    of CollectAlignmentSummaryMetrics, have one row per metrics row. For
+    example, with NumPy installed,
+    ``numpy.median(payload["columns"]["PERCENT_DUPLICATION"])`` is the median
+    duplication rate of a cohort of MarkDuplicates metrics files.
+
+    Histograms are not parsed.
+
+    :param inputs: Paths to Picard metrics files.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+    :returns: The metrics class (``class``), the sample name of each row
+        (``sample``), and the column values keyed by column name
+        (``columns``).
+    :raises click.BadParameter: if the files have different metrics classes
+        or columns.
+
+    """
+    if not inputs:
+        raise click.BadParameter("No Picard metrics files given.")
+
+    samples = get_sample_names(inputs)
+    metrics_class: Optional[str] = None
+    header_cols: Optional[List[Any]] = None
+    columns: List[List[Any]] = []
+    row_samples: List[str] = []
+    results = map_parallel(_read_metrics_rows, inputs, jobs)
+    for sample, path, (sample_class, sample_cols, rows) in zip(
+        samples, inputs, results
+    ):
+        if header_cols is None:
+            metrics_class, header_cols = sample_class, sample_cols
+            columns = [[] for _ in header_cols]
+        elif sample_class != metrics_class:
+            raise click.BadParameter(
+                f"{path}: Metrics class {sample_class} does not match the class"
+                f" {metrics_class} of the other files."
+            )
+        elif sample_cols != header_cols:
+            raise click.BadParameter(
+                f"{path}: Metrics columns do not match those of the other files."
+            )
+        if any(len(row) != len(header_cols) for row in rows):
+            raise click.BadParameter(
+                f"{path}: Metrics rows do not have the same columns as its header."
+            )
+        row_samples.extend([sample] * len(rows))
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
 
     return {
-        "header": parse_header(header, linesep),
-        "metrics": parse_metrics(metrics, linesep),
-        "histogram": parse_histogram(histo, linesep),
+        "class": metrics_class,
+        "sample": row_samples,
+        "columns": {
+            name: as_array(column)
+            for name, column in zip(cast(List[Any], header_cols), columns)
+        },
     }
@@ -0,0 +1,171 @@
+"""Parser for samtools stats output"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+from os import PathLike
+from typing import Any, Dict, List, Sequence, TextIO, Union
+
+import click
+
+from .utils import as_array, as_matrix, convert, convert_column, get_handle
+
+__all__ = ["parse"]
+
+
+_VERSION_PREFIX = "# This file was produced by samtools stats ("
+
+# Column names of the tabular sections, keyed by section tag. Columns listed in
+# _RAW_COLUMNS are kept as strings.
+_COLUMNS = {
+    "GCF": ["gc", "count"],
+    "GCL": ["gc", "count"],
+    "GCC": ["cycle", "A", "C", "G", "T", "N", "O"],
+    "GCT": ["cycle", "A", "C", "G", "T"],
+    "FBC": ["cycle", "A", "C", "G", "T", "N", "O"],
+    "LBC": ["cycle", "A", "C", "G", "T", "N", "O"],
+    "FTC": ["A", "C", "G", "T", "N"],
+    "LTC": ["A", "C", "G", "T", "N"],
+    "IS": ["insert_size", "pairs_total", "inward", "outward", "other"],
+    "RL": ["length", "count"],
+    "FRL": ["length", "count"],
+    "LRL": ["length", "count"],
+    "MAPQ": ["mapq", "count"],
+    "ID": ["length", "insertions", "deletions"],
+    "IC": [
+        "cycle",
+        "insertions_fwd",
+        "insertions_rev",
+        "deletions_fwd",
+        "deletions_rev",
+    ],
+    "COV": ["range", "depth", "count"],
+    "GCD": ["gc", "unique_percentile", "p10", "p25", "p50", "p75", "p90"],
+}
+_RAW_COLUMNS = {"range"}
+
+# Sections of quality counts, with cycles as rows and qualities as columns.
+_MATRICES = {"FFQ", "LFQ"}
+
+
+def parse_summary(rows: List[str]) -> Dict[str, Union[str, int, float]]:
+    """Parses the summary numbers (SN) section.
+
+    :param rows: Section lines, without the tag.
+    :returns: Summary numbers, keyed by their name.
+
+    """
+    summary = {}
+    for row in rows:
+        fields = row.split("\t")
+        if len(fields) > 1:
+            summary[fields[0].rstrip(":")] = convert(fields[1])
+
+    return summary
+
+
+def parse_matrix(tag: str, rows: List[str]) -> Dict[str, Sequence]:
+    """Parses a section of counts per cycle, such as FFQ and LFQ.
+
+    :param tag: Section tag.
+    :param rows: Section lines, without the tag.
+    :returns: Cycle numbers and a 2-D array of counts, with one row per cycle.
+
+    """
+    cells = [row.split("\t") for row in rows]
+    n_cols = max(map(len, cells), default=1) - 1
+    cycles, counts = [], []
+    for row in cells:
+        cycles.append(row[0])
+        counts.extend(row[1:])
+        # Pad shorter rows, in case trailing zero counts are left out.
+        counts.extend(["0"] * (n_cols + 1 - len(row)))
+
+    try:
+        return {
+            "cycle": as_array(convert_column(cycles)),
+            "counts": as_matrix(list(map(int, counts)), n_cols),
+        }
+    except ValueError:
+        raise click.BadParameter(f"Section {tag} contains non-integer counts.")
+
+
+def parse_table(tag: str, rows: List[str]) -> Union[Dict[str, Sequence], List]:
+    """Parses a tabular section into columns.
+
+    The whole section is split at once and sliced into columns, instead of
+    creating a list for each row.
+
+    :param tag: Section tag.
+    :param rows: Section lines, without the tag.
+    :returns: Column values, keyed by column name. For sections with unknown
+        columns, a list of the column values.
+
+    """
+    n_cols = rows[0].count("\t") + 1
+    cells = "\t".join(rows).split("\t")
+    if len(cells) != n_cols * len(rows):
+        raise click.BadParameter(
+            f"Section {tag} has rows with different numbers of columns."
+        )
+
+    names = _COLUMNS.get(tag)
+    columns: List[Any] = [
+        (
+            cells[idx::n_cols]
+            if names is not None and idx < len(names) and names[idx] in _RAW_COLUMNS
+            else as_array(convert_column(cells[idx::n_cols]))
+        )
+        for idx in range(n_cols)
+    ]
+    if names is None or len(names) != n_cols:
+        return columns
+
+    return dict(zip(names, columns))
+
+
+def parse(in_data: Union[str, PathLike, TextIO]) -> dict:
+    """Parses a samtools stats result into a dictionary.
+
+    The input is read once, with each line routed to its section by its tag.
+    The summary numbers (SN) become a dictionary. The checksums (CHK) become a
+    list. The quality counts per cycle (FFQ and LFQ) become a mapping of cycle
+    numbers and a 2-D array of counts. Every other section becomes a mapping
+    of column names to column values, with numeric columns as NumPy arrays,
+    or ``array.array`` if NumPy is not installed.
+
+    :param in_data: Input samtools stats contents.
+    :returns: Parsed samtools stats values, keyed by section tag.
+
+    """
+    sections: Dict[str, List[str]] = {}
+    payload: dict = {}
+    with get_handle(in_data) as fh:
+        for line in fh:
+            if line.startswith("#"):
+                if line.startswith(_VERSION_PREFIX):
+                    version = line[len(_VERSION_PREFIX) :]  # noqa: E203
+                    payload["version"] = version.split(")", 1)[0]
+                continue
+            tag, sep, rest = line.rstrip("\r\n").partition("\t")
+            if not sep:
+                continue
+            rows = sections.get(tag)
+            if rows is None:
+                rows = sections[tag] = []
+            rows.append(rest)
+
+    if not sections:
+        raise click.BadParameter("Cannot parse input samtools stats file.")
+
+    for tag, rows in sections.items():
+        if tag == "SN":
+            payload[tag] = parse_summary(rows)
+        elif tag == "CHK":
+            payload[tag] = rows[0].split("\t")
+        elif tag in _MATRICES:
+            payload[tag] = parse_matrix(tag, rows)
+        else:
+            payload[tag] = parse_table(tag, rows)
+
+    return payload
@@ -3,14 +3,29 @@
 # Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
 # SPDX-License-Identifier: BSD-3-Clause
 
+import sys
+from array import array
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from hashlib import blake2b
 from os import PathLike
-from typing import Any, Dict, List, TextIO, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import click
 
 from .utils import get_handle
 
-__all__ = ["parse"]
+__all__ = ["ReadNames", "iter_records", "parse"]
 
 # Expected column names
 # Abridged column names
@@ -267,136 +282,281 @@ def to_camel_case(field: str, prefix: str) -> str:
     return camel_case
 
 
-def parse_read_columns(
-    colnames: List[str], values: List[str]
-) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
-    """Parse the read columns out and return them seperately
+# Converters of output fields whose values are not kept as strings
+_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "nJunctionReads": int,
+    "nSpanningFrags": int,
+    "FFPM": float,
+    "est_J": float,
+    "est_S": float,
+    "breakEntropy": float,
+}
+
+# Type of a compiled side decoder: the gene column index, the breakpoint column
+# index, and the output field name, column index, and converter of each of the
+# other side-specific columns.
+_SideSpec = Tuple[int, int, List[Tuple[str, int, Callable[[str], Any]]]]
+
+
+def _compile_side(positions: Dict[str, int], prefix: str) -> _SideSpec:
+    """Resolve the columns of one side of the break, see :func:`parse_lr_entry`"""
+    sided = []
+    for colname, idx in positions.items():
+        if colname.startswith(prefix) and colname not in {
+            f"{prefix}Gene",
+            f"{prefix}Breakpoint",
+        }:
+            field = to_camel_case(colname, prefix)
+            sided.append((field, idx, _CONVERTERS.get(field, str)))
+
+    return positions[f"{prefix}Gene"], positions[f"{prefix}Breakpoint"], sided
+
+
+def _decode_side(values: List[str], spec: _SideSpec) -> Dict[str, Any]:
+    """Decode one side of the break from the values of a line"""
+    gene_idx, breakpoint_idx, sided = spec
+    gname, gid = values[gene_idx].split(_DELIM["gids"])
+    chrom, pos, strand = values[breakpoint_idx].split(_DELIM["loc"])
+
+    side: Dict[str, Any] = {
+        "geneName": gname,
+        "geneID": gid,
+        "chromosome": chrom,
+        "position": int(pos),
+        "strand": strand,
+    }
+    for field, idx, func in sided:
+        side[field] = func(values[idx])
+
+    return side
 
-    The JunctionReads and SpanningFrags columns can contain the actual reads,
-    or just the counts of the reads. This makes parsing them correctly quite
-    convoluted.
 
-    Assumption: The last occurrence of the JunctionReads and SpanningFrags
-    columns in the file contain the actual reads, while the first one contains
-    the counts.
-    If there is only one (as is the case for v1.6.0), it contains the reads
+def split_read_name(name: str) -> Tuple[str, str]:
+    """Split a read name into a prefix shared with other reads and a suffix.
+
+    For Illumina read names, e.g. ``A00123:45:HXXXXDSXX:1:1101:2912:27173``, the
+    prefix ends before the tile, x, and y fields. For other names with at least
+    one ".", e.g. ``SRR8615343.30281602``, it ends after the last ".".
+    Otherwise, the prefix is empty.
+
+    :param name: Read name.
+    :returns: The prefix and the suffix of the name.
 
-    :param values: List of values from the file
-    :param colnames: List of column names from the file
     """
-    entries = dict()
-    reads = dict()
+    if name.count(":") >= 3:
+        end = len(name.rsplit(":", 3)[0]) + 1
+    else:
+        end = name.rfind(".") + 1
+    return name[:end], name[end:]
 
-    # Keep the column names and values together
-    together = [(name, val) for name, val in zip(colnames, values)]
 
-    # Extract the JunctionReads
-    rev = together[::-1]
-    for name, val in rev:  # pragma: no branch
-        if name == "JunctionReads":
-            together.remove((name, val))
-            break
-    reads[name] = val.split(",")
+class ReadNames(SequenceABC):
+    """Read names stored as a table of their shared prefixes and their packed
+    suffixes, see :func:`split_read_name`.
 
-    # Extract the SpanningFrags
-    for name, val in rev:  # pragma: no branch
-        if name == "SpanningFrags":
-            together.remove((name, val))
-            break
-    reads[name] = val.split(",")
+    Each name is stored as the index of its prefix and a part of one string
+    holding all the comma-separated suffixes, instead of as a separate string.
+    Names are only created when they are accessed, so the container behaves
+    like a read-only list of strings. Since the names are packed, accessing a
+    single name by index takes time proportional to the number of names.
 
-    # The other columns are regular entries
-    entries = {k: v for k, v in together}
+    :param names: Read names, which must not contain commas.
 
-    return entries, reads
+    """
+
+    __slots__ = ("_prefixes", "_prefix_ids", "_suffixes")
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        table: Dict[str, int] = {}
+        prefix_ids = []
+        suffixes = []
+        for name in names:
+            if "," in name:
+                raise ValueError(f"Read name {name!r} contains a comma.")
+            prefix, suffix = split_read_name(name)
+            prefix_ids.append(table.setdefault(prefix, len(table)))
+            suffixes.append(suffix)
+        self._pack(list(table), prefix_ids, ",".join(suffixes))
+
+    def _pack(
+        self, prefixes: List[str], prefix_ids: Iterable[int], suffixes: str
+    ) -> None:
+        # Prefixes are interned, so that equal prefixes of different
+        # containers are stored once.
+        self._prefixes = tuple(map(sys.intern, prefixes))
+        self._prefix_ids = array("B" if len(prefixes) <= 256 else "L", prefix_ids)
+        self._suffixes = suffixes
+
+    @classmethod
+    def from_column(cls, value: str) -> "ReadNames":
+        """Create a container from a column of comma-separated read names"""
+        if value == ".":
+            return cls()
+
+        # Reads of one fusion usually come from the same run and lane, so try
+        # stripping the prefix of the first name from all of them at once.
+        prefix, _ = split_read_name(value.split(",", 1)[0])
+        marked = f",{value}"
+        n_names = value.count(",") + 1
+        if marked.count(f",{prefix}") != n_names:
+            return cls(value.split(","))
+
+        names = cls.__new__(cls)
+        names._pack([prefix], bytes(n_names), marked.replace(f",{prefix}", ",")[1:])
+        return names
+
+    def __len__(self) -> int:
+        return len(self._prefix_ids)
+
+    def __getitem__(self, idx: Any) -> Any:
+        if isinstance(idx, slice):
+            return self.tolist()[idx]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("read name index out of range")
+        suffix = self._suffixes.split(",", idx + 1)[idx]
+        return self._prefixes[self._prefix_ids[idx]] + suffix
+
+    def __iter__(self) -> Iterator[str]:
+        prefixes = self._prefixes
+        for prefix_id, suffix in zip(self._prefix_ids, self._suffixes.split(",")):
+            yield prefixes[prefix_id] + suffix
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (ReadNames, list, tuple)):
+            return NotImplemented
+        return self.tolist() == list(other)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.tolist()!r})"
+
+    def tolist(self) -> List[str]:
+        """Return the read names as a list, e.g. for serialization"""
+        return list(self)
+
+
+def _split_reads(value: str) -> List[str]:
+    """Split a column of read names, which contains "." if there are none"""
+    reads = value.split(",")
+    if reads == ["."]:
+        return []
+    return reads
+
+
+def _count_reads(value: str) -> int:
+    """Count the read names in a column, without splitting it"""
+    if value == ".":
+        return 0
+    return value.count(",") + 1
+
+
+def _hash_reads(value: str) -> str:
+    """Digest the comma-separated read names in a column"""
+    if value == ".":
+        value = ""
+    return blake2b(value.encode(), digest_size=_DIGEST_SIZE).hexdigest()
+
+
+# Size of the read name digests, in bytes
+_DIGEST_SIZE = 16
+
+# Functions for decoding the read name columns, keyed by the reads mode. The
+# "none" mode leaves the reads out entirely.
+_READS_DECODERS: Dict[str, Callable[[str], Any]] = {
+    "full": _split_reads,
+    "count": _count_reads,
+    "hashed": _hash_reads,
+    "compact": ReadNames.from_column,
+}
+
+READS_MODES = ("full", "compact", "count", "hashed", "none")
+
+
+@lru_cache(maxsize=None)
+def compile_decoder(
+    version: str,
+    is_abridged: bool = True,
+    reads: str = "full",
+) -> Callable[[str], Dict[str, Any]]:
+    """Return a function that decodes a line of the given format.
+
+    The column indices, converters, and output field names only depend on the
+    format, so they are resolved once here instead of for every line.
+
+    :param version: The version of the output format present in the file.
+    :param is_abridged: Whether the lines are from an abridged file.
+    :param reads: How the supporting read names of non-abridged files are
+        stored, see :func:`parse`.
+
+    """
+    if reads not in READS_MODES:
+        msg = "Unknown reads mode {0!r}; expected one of {1}."
+        raise click.BadParameter(msg.format(reads, ", ".join(READS_MODES)))
+    colnames = SUPPORTED[version]
+    n_cols = len(colnames)
+    mapping = COL_MAPPING[version]
+
+    # If the format is not abridged, the last JunctionReads and SpanningFrags
+    # columns contain the reads, while the other columns are regular entries.
+    # Column names present twice refer to their last occurrence, but keep the
+    # position of their first one.
+    junction_idx = spanning_idx = -1
+    if not is_abridged:
+        junction_idx = n_cols - 1 - colnames[::-1].index("JunctionReads")
+        spanning_idx = n_cols - 1 - colnames[::-1].index("SpanningFrags")
+    positions: Dict[str, int] = {}
+    for idx, colname in enumerate(colnames):
+        if idx != junction_idx and idx != spanning_idx:
+            positions[colname] = idx
+
+    fields: Dict[str, int] = {}
+    for colname, idx in positions.items():
+        if colname in mapping:
+            fields[mapping[colname]] = idx
+    funcs = [
+        (field, idx, _CONVERTERS.get(field, parse_annots if field == "annots" else str))
+        for field, idx in fields.items()
+    ]
+    left = _compile_side(positions, "Left")
+    right = _compile_side(positions, "Right")
+    decode_reads = None if is_abridged else _READS_DECODERS.get(reads)
+
+    def decode(raw_line: str) -> Dict[str, Any]:
+        values = raw_line.split("\t")
+        if len(values) != n_cols:
+            msg = "Line values {0} does not match column names {1}."
+            raise click.BadParameter(msg.format(values, colnames))
+
+        ret = {field: func(values[idx]) for field, idx, func in funcs}
+        ret["left"] = _decode_side(values, left)
+        ret["right"] = _decode_side(values, right)
+        if decode_reads is not None:
+            ret["reads"] = {
+                "junctionReads": decode_reads(values[junction_idx]),
+                "spanningFrags": decode_reads(values[spanning_idx]),
+            }
+
+        return ret
+
+    return decode
 
 
 def parse_raw_line(
     raw_line: str,
     version: str,
     is_abridged: bool = True,
+    reads: str = "full",
 ) -> Dict[str, Any]:
     """Parse a single line into a dictionary.
 
     :param raw_line: STAR-Fusion result line.
     :param version: The version of the output format present in the file.
     :param is_abridged: Whether the input raw line is from an abridged file.
+    :param reads: How the supporting read names are stored, see :func:`parse`.
 
     """
-    values = raw_line.split("\t")
-    colnames = SUPPORTED[version]
-
-    if len(values) != len(colnames):
-        msg = "Line values {0} does not match column names {1}."
-        raise click.BadParameter(msg.format(values, colnames))
-
-    if is_abridged:
-        entries = {k: v for k, v in zip(colnames, values)}
-        reads = dict()  # type: Dict[str, List[str]]
-    else:
-        # If the format is not abridged, the JunctionReads and SpanningFrags
-        # columns are duplicated
-        entries, reads = parse_read_columns(colnames, values)
-
-    # Create the output dictionary based on the detected star-fusion version
-    ret = dict()  # type: Dict[str, Any]
-    for colname in entries:
-        try:
-            field_name = COL_MAPPING[version][colname]
-        # For mappings that are handle elsewhere, such as LeftBreakpoint
-        except KeyError:
-            continue
-        ret[field_name] = entries[colname]
-
-    # Cast the apropriate entries to int
-    # These values should always exist
-    for int_field in ["nJunctionReads", "nSpanningFrags"]:
-        ret[int_field] = int(ret[int_field])
-
-    # Handle the special columns
-    ret["left"] = parse_lr_entry("left", entries)
-    ret["right"] = parse_lr_entry("right", entries)
-
-    # Parse the annotations into a list. Not present in v0.6.0
-    if "annots" in ret:
-        ret["annots"] = parse_annots(ret["annots"])
-
-    # Cast the apropriate entries to float
-    # These values can be missing
-    if "FFPM" in ret:
-        ret["FFPM"] = float(ret["FFPM"])
-
-    # Cast right entropy to float, not present in v0.6.0
-    try:
-        ret["right"]["breakEntropy"] = float(ret["right"]["breakEntropy"])
-    except KeyError:
-        pass
-
-    # Cast left entropy to float, not present in v0.6.0
-    try:
-        ret["left"]["breakEntropy"] = float(ret["left"]["breakEntropy"])
-    except KeyError:
-        pass
-
-    # Cast est_J and est_S to float, not present before v1.10
-    if "est_J" in ret:
-        ret["est_J"] = float(ret["est_J"])
-    if "est_S" in ret:
-        ret["est_S"] = float(ret["est_S"])
-
-    if reads:
-        ret["reads"] = {
-            "junctionReads": reads["JunctionReads"],
-            "spanningFrags": reads["SpanningFrags"],
-        }
-        # If there are not reads in the star-fusion output file, the column
-        # will contain ".". We need to clean that up
-        if ret["reads"]["junctionReads"] == ["."]:
-            ret["reads"]["junctionReads"] = list()
-        if ret["reads"]["spanningFrags"] == ["."]:
-            ret["reads"]["spanningFrags"] = list()
-
-    return ret
+    return compile_decoder(version, is_abridged, reads)(raw_line)
 
 
 def detect_format(colnames: List[str]) -> str:
@@ -423,13 +583,18 @@ def parse_annots(annots: str) -> List[str]:
     return [annotation.replace('"', "") for annotation in annots.split(",")]
 
 
-def parse(in_data: Union[str, PathLike, TextIO]) -> List[dict]:
-    """Parses the abridged output of a STAR-Fusion run.
+def iter_records(
+    in_data: Union[str, PathLike, TextIO],
+    reads: str = "full",
+) -> Iterator[dict]:
+    """Yields the records of a STAR-Fusion output one line at a time.
+
+    Unlike :func:`parse`, only the record being parsed is kept in memory.
 
     :param in_data: Input STAR-Fusion contents.
+    :param reads: How the supporting read names are stored, see :func:`parse`.
 
     """
-    payload = []
     with get_handle(in_data) as src:
         first_line = src.readline().strip()
         if not first_line.startswith("#"):
@@ -438,9 +603,32 @@ def parse(in_data: Union[str, PathLike, TextIO]) -> List[dict]:
         # Parse column names, after removing the "#" character
         colnames = first_line[1:].split("\t")
         version = detect_format(colnames)
-        is_abridged = version.endswith("_abr")
-        for line in (x.strip() for x in src):
-            parsed = parse_raw_line(line, version, is_abridged)
-            payload.append(parsed)
+        decode = compile_decoder(version, version.endswith("_abr"), reads)
+        for line in src:
+            yield decode(line.strip())
+
+
+def parse(
+    in_data: Union[str, PathLike, TextIO],
+    reads: str = "full",
+) -> List[dict]:
+    """Parses the abridged output of a STAR-Fusion run.
+
+    Records of non-abridged outputs also contain the names of their supporting
+    junction reads and spanning fragments, stored depending on ``reads``:
 
-    return payload
+    * ``full``: lists of read names.
+    * ``compact``: :class:`ReadNames` containers, which behave like the lists
+      of ``full`` but take less memory. They are written as lists.
+    * ``count``: the number of read names.
+    * ``hashed``: hex digests (BLAKE2b, 16 bytes) of the comma-separated read
+      names, for checking whether two records have the same supporting reads.
+    * ``none``: the reads are left out of the records.
+
+    The read name lists are only created in the ``full`` mode.
+
+    :param in_data: Input STAR-Fusion contents.
+    :param reads: How the supporting read names are stored.
+
+    """
+    return list(iter_records(in_data, reads))
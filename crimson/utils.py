@@ -6,17 +6,46 @@
 import json
 import os
 import re
+from array import array
+from collections import defaultdict, deque
+from collections.abc import Iterator as IteratorABC
 from contextlib import contextmanager
+from functools import lru_cache
+from importlib.util import find_spec
 from os import PathLike, linesep
 from pathlib import Path
-from typing import cast, IO, Generator, List, Optional, TextIO, Union
+from typing import (
+    cast,
+    IO,
+    Any,
+    Callable,
+    Container,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    TypeVar,
+    Union,
+)
 
 import click
-import yaml
 
 LINESEPS = {"nt": "\r\n", "posix": "\n"}
 RE_INT = re.compile(r"^([-+]?\d+)L?$")
 RE_FLOAT = re.compile(r"^([-+]?\d*\.?\d+(?:[eE][-+]?[0-9]+)?)$")
+# Tab-terminated sequence of floats with no sign nor exponent.
+RE_PLAIN_FLOATS = re.compile(r"(?:\d*\.\d+\t)*")
+
+# Maximum number of items sent to a worker process at once by map_parallel.
+_MAX_CHUNKSIZE = 64
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def convert(raw_str: str) -> Union[str, int, float]:
@@ -39,33 +68,430 @@ def convert(raw_str: str) -> Union[str, int, float]:
     return raw_str
 
 
+def _convert_int(raw_str: str) -> Union[str, int, float]:
+    """Converts values of a column that looks like it holds integers."""
+    if raw_str.isdecimal():
+        return int(raw_str)
+    return convert(raw_str)
+
+
+def _convert_float(raw_str: str) -> Union[str, int, float]:
+    """Converts values of a column that looks like it holds floats."""
+    head, dot, tail = raw_str.partition(".")
+    if dot and tail.isdecimal() and (not head or head.isdecimal()):
+        return float(raw_str)
+    return convert(raw_str)
+
+
+def _convert_str(raw_str: str) -> Union[str, int, float]:
+    """Converts values of a column that looks like it holds strings."""
+    # Both RE_INT and RE_FLOAT can only match if the string starts with a
+    # sign, a dot, or a digit.
+    if raw_str[:1].isdecimal() or raw_str[:1] in "+-.":
+        return convert(raw_str)
+    return raw_str
+
+
+def get_converter(raw_str: str) -> Callable[[str], Union[str, int, float]]:
+    """Returns a converter for a column, inferred from one of its values.
+
+    The returned function gives the same results as :func:`convert` for any
+    input, but is faster for values of the same type as the given one. Values
+    of other types fall back to :func:`convert`.
+
+    :param raw_str: Sample value of the column.
+
+    """
+    value = convert(raw_str)
+    if isinstance(value, int):
+        return _convert_int
+    if isinstance(value, float):
+        return _convert_float
+    return _convert_str
+
+
+def convert_column(raw_strs: Iterable[str]) -> List[Union[str, int, float]]:
+    """Converts the values of a single column.
+
+    This is equivalent to calling :func:`convert` on each value. The type of
+    the column is inferred from its first value, and if all the other values
+    are of the same type, they are converted in one go. Otherwise, each value
+    is converted individually.
+
+    :param raw_strs: Column values.
+
+    """
+    values = list(raw_strs)
+    if not values:
+        return []
+
+    func = get_converter(values[0])
+    if func is _convert_int and all(map(str.isdecimal, values)):
+        return list(map(int, values))
+    if func is _convert_float:
+        joined = "\t".join(values) + "\t"
+        if joined.count("\t") == len(values) and RE_PLAIN_FLOATS.fullmatch(joined):
+            return list(map(float, values))
+
+    return list(map(func, values))
+
+
+def convert_rows(
+    rows: Iterable[Sequence[str]],
+    raw_cols: Container[int] = (),
+) -> List[Sequence[Union[str, int, float]]]:
+    """Converts the values of a table, column by column.
+
+    This is equivalent to calling :func:`convert` on each value, but much
+    faster for tables whose columns each hold values of one type.
+
+    :param rows: Table rows, without the header.
+    :param raw_cols: Indices of columns whose values are kept as strings.
+
+    """
+    rows = list(rows)
+    if len(set(map(len, rows))) > 1:
+        # Ragged rows; fall back to inferring converters row by row.
+        return _convert_ragged_rows(rows, raw_cols)
+
+    columns = [
+        list(col) if idx in raw_cols else convert_column(col)
+        for idx, col in enumerate(zip(*rows))
+    ]
+
+    return list(zip(*columns))
+
+
+def _convert_ragged_rows(
+    rows: List[Sequence[str]],
+    raw_cols: Container[int] = (),
+) -> List[Sequence[Union[str, int, float]]]:
+    """Converts the values of a table whose rows have different lengths."""
+
+    def keep(raw_str: str) -> str:
+        return raw_str
+
+    funcs: List[Callable[[str], Union[str, int, float]]] = []
+    converted: List[Sequence[Union[str, int, float]]] = []
+    for row in rows:
+        if len(row) > len(funcs):
+            funcs.extend(
+                keep if idx in raw_cols else get_converter(row[idx])
+                for idx in range(len(funcs), len(row))
+            )
+        converted.append([func(value) for func, value in zip(funcs, row)])
+
+    return converted
+
+
+@lru_cache(maxsize=None)
+def _get_numpy() -> Any:
+    """Returns the numpy module if it is installed, or None otherwise."""
+    if find_spec("numpy") is None:
+        return None
+
+    import numpy
+
+    return numpy
+
+
+def as_array(values: List[Any]) -> Sequence:
+    """Returns the values of a column as a typed array, if possible.
+
+    Columns of ints become int64 arrays and columns of ints and floats become
+    float64 arrays. These are NumPy arrays if NumPy is installed, and
+    ``array.array`` otherwise. Any other column is returned unchanged.
+
+    :param values: Column values, as returned by :func:`convert_column`.
+
+    """
+    if all(type(value) is int for value in values):
+        dtype, typecode = "int64", "q"
+    elif all(type(value) in (int, float) for value in values):
+        dtype, typecode = "float64", "d"
+    else:
+        return values
+
+    numpy = _get_numpy()
+    try:
+        if numpy is not None:
+            return cast(Sequence, numpy.array(values, dtype=dtype))
+        return array(typecode, values)
+    except OverflowError:
+        return values
+
+
+def as_matrix(values: List[int], n_cols: int) -> Sequence:
+    """Returns a flat list of ints as a 2-D int64 array.
+
+    The result is a NumPy array if NumPy is installed, and a list of
+    ``array.array`` rows otherwise.
+
+    :param values: Values of all rows, one row after another.
+    :param n_cols: Number of columns of each row.
+
+    """
+    n_rows = len(values) // n_cols if n_cols else 0
+    numpy = _get_numpy()
+    if numpy is not None:
+        matrix = numpy.array(values, dtype="int64").reshape(n_rows, n_cols)
+        return cast(Sequence, matrix)
+
+    return [
+        array("q", values[row * n_cols : (row + 1) * n_cols])  # noqa: E203
+        for row in range(n_rows)
+    ]
+
+
+def _json_default(obj: Any) -> Any:
+    """Encodes arrays, which the JSON encoders do not support, as lists."""
+    if isinstance(obj, array) or hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _encode_json_stdlib(
+    payload: Any,
+    compact: bool = False,
+    indent: int = 4,
+    sort_keys: bool = True,
+) -> str:
+    """Encodes the payload using the standard library JSON encoder."""
+    # json.dumps is used instead of json.dump since the latter always uses the
+    # pure Python encoder and writes each small chunk separately.
+    if compact:
+        return json.dumps(
+            payload,
+            sort_keys=sort_keys,
+            separators=(",", ":"),
+            default=_json_default,
+        )
+    return json.dumps(
+        payload, sort_keys=sort_keys, indent=indent, default=_json_default
+    )
+
+
+def _encode_json_orjson(
+    payload: Any,
+    compact: bool = False,
+    indent: int = 4,
+    sort_keys: bool = True,
+) -> str:
+    """Encodes the payload using orjson."""
+    # orjson can only indent with two spaces.
+    if not compact and indent != 2:
+        return _encode_json_stdlib(payload, compact, indent, sort_keys)
+
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if not compact:
+        option |= orjson.OPT_INDENT_2
+
+    encoded: bytes = orjson.dumps(payload, default=_json_default, option=option)
+
+    return encoded.decode("utf-8")
+
+
+JSONEncoder = Callable[[Any, bool, int, bool], str]
+
+# Available JSON backends. The orjson output is not byte-identical to the
+# standard library's: floats may be formatted differently and non-ASCII
+# characters are not escaped.
+JSON_BACKENDS: Dict[str, JSONEncoder] = {
+    "stdlib": _encode_json_stdlib,
+    "orjson": _encode_json_orjson,
+}
+
+
+def get_json_encoder(backend: str = "stdlib") -> JSONEncoder:
+    """Returns the JSON encoding function of the given backend.
+
+    :param backend: Name of the backend. The value 'auto' selects orjson if it
+        is installed, and the standard library otherwise.
+
+    """
+    if backend == "auto":
+        backend = "orjson" if find_spec("orjson") is not None else "stdlib"
+
+    encoder = JSON_BACKENDS.get(backend)
+    if encoder is None:
+        raise ValueError(f"Unknown JSON backend {backend!r}")
+    if backend != "stdlib" and find_spec(backend) is None:
+        raise ValueError(f"JSON backend {backend!r} is not installed")
+
+    return encoder
+
+
 def write_output(
-    payload: Union[dict, List[dict]],
+    payload: Union[dict, List[dict], Iterator[dict]],
     out_handle: TextIO,
     fmt: str = "json",
     compact: bool = False,
     indent: int = 4,
+    sort_keys: bool = True,
+    json_backend: str = "stdlib",
 ) -> None:
     """Writes the given dictionary as JSON or YAML to the output handle.
 
+    The payload may also be an iterator of records, such as the ones returned
+    by the ``iter_records`` functions. In JSON, the records are then written
+    one at a time, with the same result as writing the equivalent list.
+
     :param payload: Payload to write.
     :param out_handle: Output handle.
     :param fmt: Output format.
     :param compact: Whether to write a compact JSON or not. Ignored if the
         output format is JSON.
     :param indent: Indentation level (ignored if output ``compact`` is true).
+    :param sort_keys: Whether to sort mapping keys or not.
+    :param json_backend: Name of the JSON backend, see :func:`get_json_encoder`.
+        Ignored if the output format is YAML.
 
     """
     if fmt == "json":
-        if compact:
-            json.dump(
-                payload, out_handle, sort_keys=True, indent=None, separators=(",", ":")
-            )
+        encode = get_json_encoder(json_backend)
+        if isinstance(payload, IteratorABC):
+            write_json_array(payload, out_handle, compact, indent, sort_keys, encode)
         else:
-            json.dump(payload, out_handle, sort_keys=True, indent=indent)
+            out_handle.write(encode(payload, compact, indent, sort_keys))
+        if not compact:
             out_handle.write(linesep)
     else:
-        out_handle.write(yaml.dump(payload, default_flow_style=False, indent=indent))
+        import yaml
+
+        if isinstance(payload, IteratorABC):
+            payload = list(payload)
+        yaml.dump(
+            payload,
+            out_handle,
+            Dumper=get_yaml_dumper(),
+            default_flow_style=False,
+            indent=indent,
+            sort_keys=sort_keys,
+        )
+
+
+def write_json_array(
+    records: Iterable[dict],
+    out_handle: TextIO,
+    compact: bool = False,
+    indent: int = 4,
+    sort_keys: bool = True,
+    encode: JSONEncoder = _encode_json_stdlib,
+) -> None:
+    """Writes records as a JSON array, one record at a time.
+
+    The output is identical to dumping the equivalent list with the same
+    settings, but only one encoded record is held in memory at any time.
+
+    :param records: Records to write.
+    :param out_handle: Output handle.
+    :param compact: Whether to write a compact JSON or not.
+    :param indent: Indentation level (ignored if ``compact`` is true).
+    :param sort_keys: Whether to sort mapping keys or not.
+    :param encode: JSON encoding function, see :func:`get_json_encoder`.
+
+    """
+    start, delim, end = "[", ",", "]"
+    if not compact:
+        # JSON strings can not contain raw newlines, so every newline in an
+        # encoded record is a line break that needs one more indentation level.
+        newline = "\n" + " " * indent
+        start, delim, end = "[" + newline, "," + newline, "\n]"
+
+    written = False
+    for record in records:
+        encoded = encode(record, compact, indent, sort_keys)
+        if not compact:
+            encoded = encoded.replace("\n", newline)
+        out_handle.write((delim if written else start) + encoded)
+        written = True
+
+    out_handle.write(end if written else "[]")
+
+
+def write_ndjson(
+    records: Iterable[dict],
+    out_handle: TextIO,
+    sort_keys: bool = True,
+    encode: JSONEncoder = _encode_json_stdlib,
+) -> None:
+    """Writes each record as a compact JSON object on its own line.
+
+    Records are written as soon as they are produced, so the given iterable
+    may be a generator of arbitrary length.
+
+    :param records: Records to write.
+    :param out_handle: Output handle.
+    :param sort_keys: Whether to sort mapping keys or not.
+    :param encode: JSON encoding function, see :func:`get_json_encoder`.
+
+    """
+    for record in records:
+        out_handle.write(encode(record, True, 0, sort_keys))
+        out_handle.write("\n")
+
+
+@lru_cache(maxsize=None)
+def get_yaml_dumper() -> type:
+    """Returns the YAML dumper class used for writing outputs.
+
+    The dumper is based on the LibYAML-backed ``CSafeDumper`` if PyYAML was
+    built with it, and on the pure Python ``SafeDumper`` otherwise.
+
+    """
+    import yaml
+
+    base = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    class Dumper(base):  # type: ignore[valid-type,misc]
+        pass
+
+    def represent_other(dumper: Any, data: Any) -> Any:
+        # Columnar results hold arrays, which are written as plain sequences.
+        if isinstance(data, array) or hasattr(data, "tolist"):
+            return dumper.represent_list(data.tolist())
+        return dumper.represent_undefined(data)
+
+    # Some parsers return defaultdicts, which should be written as plain
+    # mappings instead of as Python objects.
+    Dumper.add_representer(defaultdict, yaml.SafeDumper.represent_dict)
+    Dumper.add_representer(None, represent_other)
+
+    return Dumper
+
+
+def write_yaml_stream(
+    records: Iterable[dict],
+    out_handle: TextIO,
+    indent: int = 4,
+    sort_keys: bool = True,
+) -> None:
+    """Writes each record as a separate document of a YAML stream.
+
+    Records are written as soon as they are produced, so the given iterable
+    may be a generator of arbitrary length.
+
+    :param records: Records to write.
+    :param out_handle: Output handle.
+    :param indent: Indentation level.
+    :param sort_keys: Whether to sort mapping keys or not.
+
+    """
+    import yaml
+
+    yaml.dump_all(
+        records,
+        out_handle,
+        Dumper=get_yaml_dumper(),
+        default_flow_style=False,
+        explicit_start=True,
+        indent=indent,
+        sort_keys=sort_keys,
+    )
 
 
 @contextmanager
@@ -111,3 +537,68 @@ def get_linesep(system: Optional[str]) -> str:
         return linesep
 
     raise ValueError(f"Can not resolve linesep for system {system!r}")
+
+
+def get_sample_names(inputs: Sequence[Union[str, PathLike]]) -> List[str]:
+    """Returns the sample names of files, one file per sample.
+
+    A sample name is the file name without its last extension, e.g. 'S1' for
+    'path/to/S1.flagstat'.
+
+    :param inputs: Paths to the files of each sample.
+    :returns: Sample names, in the same order as the paths.
+    :raises click.BadParameter: if two files have the same sample name.
+
+    """
+    samples = [Path(path).stem for path in inputs]
+    seen = set()
+    for sample, path in zip(samples, inputs):
+        if sample in seen:
+            raise click.BadParameter(f"Sample name {sample!r} of {path} is not unique.")
+        seen.add(sample)
+
+    return samples
+
+
+def _map_chunk(func: Callable[[T], R], chunk: Sequence[T]) -> List[R]:
+    """Applies a function to each item of a chunk, in a worker process."""
+    return [func(item) for item in chunk]
+
+
+def map_parallel(
+    func: Callable[[T], R],
+    items: Sequence[T],
+    jobs: Optional[int] = None,
+) -> Iterator[R]:
+    """Applies a function to each item, optionally across a process pool.
+
+    Results are yielded in the same order as the input items. When ``jobs`` is
+    1, the items are processed serially in the current process. Otherwise, the
+    items are sent to the workers in chunks, and only a few chunks per worker
+    are in flight at any time, so memory use does not grow with the number of
+    items.
+
+    :param func: One-argument function to apply. It must be picklable when more
+        than one job is used, i.e. defined at module level.
+    :param items: Items to process.
+    :param jobs: Number of worker processes. If None, the number of CPUs in the
+        system is used.
+
+    """
+    if jobs == 1 or len(items) <= 1:
+        yield from map(func, items)
+        return
+
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, min(len(items) // (jobs * 4), _MAX_CHUNKSIZE))
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for start in range(0, len(items), chunksize):
+            end = start + chunksize
+            pending.append(executor.submit(_map_chunk, func, items[start:end]))
+            if len(pending) >= jobs * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -4,38 +4,69 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import collections
+from itertools import chain
 from os import PathLike
-from typing import Dict, List, Optional, TextIO, Tuple, Union
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
 
 import click
 
-from .utils import convert, get_handle, get_linesep
+from .utils import convert_column, get_handle
 
 __all__ = ["parse"]
 
 
-# Default maximum file size ~ because our parser is not a streaming parser.
-_MAX_SIZE = 1024 * 500  # 500 Kb
+_FIRST_SECTION = "[VEP run statistics]"
+
+# Lines printed without a value when VEP was run on an empty input file.
+_EMPTY_RUN_LINES = {"Lines of input read", "Variants processed"}
+
+Entry = Union[List[Union[str, int, float]], Dict[str, Union[str, int, float]]]
+
+
+def parse_value_line(line: str) -> Optional[List[str]]:
+    """Splits a line of a VEP statistics group into its name and raw value.
+
+    :param line: Line of a VEP statistics group, without the line separator.
+    :returns: Name and raw value of the line, or None if the line has no value.
+
+    """
+    # This is the regular case
+    if "\t" in line:
+        return line.split("\t", 1)
+    # Special cases where VEP was run on an emtpy input file
+    if line in _EMPTY_RUN_LINES:
+        return [line, "0"]
+    return None
 
 
 def parse_raw_value(raw_value: str, linesep: str) -> List[List[str]]:
     """Parse raw values from VEP"""
     parsed = list()
     for line in raw_value.strip().split(linesep):
-        # This is the regular case
-        if "\t" in line:
-            parsed.append(line.split("\t", 1))
-        # Special cases where VEP was run on an emtpy input file
-        elif line == "Lines of input read":
-            parsed.append(["Lines of input read", "0"])
-        elif line == "Variants processed":
-            parsed.append(["Variants processed", "0"])
+        value = parse_value_line(line)
+        if value is not None:
+            parsed.append(value)
     return parsed
 
 
-def group2entry(
-    group: str, linesep: str
-) -> Tuple[str, Union[List[Union[str, int, float]], Dict[str, Union[str, int, float]]]]:
+def make_entry(key: str, values: Iterable[List[str]]) -> Entry:
+    """Converts the raw values of a VEP statistics group.
+
+    :param key: Name of the group, without the brackets.
+    :param values: Names and raw values of the group lines.
+    :returns: Converted values, as a list for groups of variant distributions
+        and keyed by their name otherwise.
+
+    """
+    values = list(values)
+    converted = convert_column(v for _, v in values)
+    if not key.startswith("Distribution of variants on"):
+        return {k: v for (k, _), v in zip(values, converted)}
+
+    return converted
+
+
+def group2entry(group: str, linesep: str) -> Tuple[str, Entry]:
     """Given the raw string of a VEP statistics group, parse it into a
     key, value tuple.
 
@@ -84,36 +115,73 @@ def group2entry(
     # Remove the brackets from the key
     key = raw_key[1:-1]
 
-    values = parse_raw_value(raw_value, linesep)
-
-    if not key.startswith("Distribution of variants on"):
-        valued = {k: convert(v) for k, v in values}
-        return key, valued
-
-    return key, [convert(v) for _, v in values]
+    return key, make_entry(key, parse_raw_value(raw_value, linesep))
 
 
 def parse(
     in_data: Union[str, PathLike, TextIO],
     input_linesep: Optional[str] = None,
-    max_size: int = _MAX_SIZE,
+    max_size: Optional[int] = None,
 ) -> dict:
     """Parse a VEP plain text statistics file into a dictionary.
 
+    The input is read one line at a time, with each bracketed line starting a
+    new group that ends at the next empty line. Both ``\\n`` and ``\\r\\n``
+    line separators are detected, and files of any size are parsed.
+
     :param in_data: Input VEP statistics contents.
-    :param input_linesep: Name of the operating system used for determining
-        input line separator. Valid values are 'nt', 'posix', or None.
-    :param max_size: Maximum expected size of input contents (default: 500 KiB).
+    :param input_linesep: Ignored, since line separators are detected
+        automatically. Kept for backwards compatibility.
+    :param max_size: Ignored, since files of any size are parsed. Kept for
+        backwards compatibility.
 
     """
-    with get_handle(in_data) as fh:
-        contents = fh.read(max_size)
+    payload: Dict[str, Entry] = {}
+    key: Optional[str] = None
+    values: List[List[str]] = []
+    # Group line whose value is not parsed yet, since the last line of a group
+    # has its trailing whitespace removed.
+    pending: Optional[str] = None
 
-    if not contents.startswith("[VEP run statistics]"):
-        msg = "Unexpected file structure. No contents parsed."
-        raise click.BadParameter(msg)
+    with get_handle(in_data) as fh:
+        first_line = fh.readline()
+        if not first_line.startswith(_FIRST_SECTION):
+            msg = "Unexpected file structure. No contents parsed."
+            raise click.BadParameter(msg)
+
+        for line in chain([first_line], fh):
+            line = line.rstrip("\r\n")
+            if not line:
+                if key is not None:
+                    payload[key] = _end_group(key, values, pending)
+                    key = None
+            elif key is None:
+                # Remove the brackets from the key
+                key, values, pending = line[1:-1], [], None
+            else:
+                if pending is None:
+                    line = line.lstrip()
+                else:
+                    value = parse_value_line(pending)
+                    if value is not None:
+                        values.append(value)
+                pending = line
+
+    if key is not None:
+        payload[key] = _end_group(key, values, pending)
+
+    return payload
+
+
+def _end_group(key: str, values: List[List[str]], pending: Optional[str]) -> Entry:
+    """Converts the values of a group once its last line is read."""
+    # If there are no values for this section, return a default dict of
+    # integers, so that any property a user requests will be 0
+    if pending is None:
+        return collections.defaultdict(int)
 
-    linesep = get_linesep(input_linesep)
-    entries = [group2entry(g, linesep) for g in contents.split(linesep * 2)]
+    value = parse_value_line(pending.rstrip())
+    if value is not None:
+        values.append(value)
 
-    return dict(entries)
+    return make_entry(key, values)
@@ -0,0 +1,77 @@
+"""batch subcommand tests"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import pytest
+from click import BadParameter
+from click.testing import CliRunner
+
+from crimson.batch import Task, read_manifest
+from crimson.cli import main
+from .utils import get_test_path
+
+
+def make_manifest(tmp_path, entries):
+    manifest = tmp_path / "manifest.tsv"
+    lines = [
+        "\t".join([tool, get_test_path(bname), str(tmp_path / out)])
+        for tool, bname, out in entries
+    ]
+    manifest.write_text("\n".join(["# tool\tinput\toutput", *lines]) + "\n")
+    return manifest
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch(tmp_path, jobs):
+    entries = [
+        ("flagstat", "samtools_flagstat_v11_01.txt", "flagstat.json"),
+        ("picard", "picard_insert_size_v1124_01.txt", "picard.json"),
+        ("star-fusion", "star_fusion_v060_01.txt", "star_fusion.json"),
+    ]
+    manifest = make_manifest(tmp_path, entries)
+    runner = CliRunner()
+    result = runner.invoke(main, ["batch", "--jobs", jobs, str(manifest)])
+
+    assert result.exit_code == 0, result.output
+    assert "Converted 3 of 3 file(s)." in result.output
+    for tool, bname, out in entries:
+        single = runner.invoke(main, [tool, get_test_path(bname)])
+        assert (tmp_path / out).read_text() == single.output
+
+
+def test_batch_failure(tmp_path):
+    entries = [
+        ("flagstat", "samtools_flagstat_nope.txt", "nope.json"),
+        ("flagstat", "samtools_flagstat_v11_01.txt", "flagstat.json"),
+    ]
+    manifest = make_manifest(tmp_path, entries)
+    runner = CliRunner()
+    result = runner.invoke(main, ["batch", str(manifest)])
+
+    assert result.exit_code != 0
+    assert "Converted 1 of 2 file(s)." in result.output
+    assert "Cannot parse input flagstat file." in result.output
+    assert not (tmp_path / "nope.json").exists()
+    assert (tmp_path / "flagstat.json").exists()
+
+
+def test_read_manifest(tmp_path):
+    manifest = make_manifest(tmp_path, [("vep", "vep_v77_01.txt", "vep.json")])
+    assert read_manifest(str(manifest)) == [
+        Task("vep", get_test_path("vep_v77_01.txt"), str(tmp_path / "vep.json"))
+    ]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "vep\tin.txt",
+        "nope\tin.txt\tout.json",
+    ],
+)
+def test_read_manifest_raises(tmp_path, line):
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text(line + "\n")
+    with pytest.raises(BadParameter):
+        read_manifest(str(manifest))
@@ -0,0 +1,70 @@
+"""Command line entry point tests"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import subprocess
+import sys
+from os.path import dirname
+
+from click.testing import CliRunner
+
+from crimson import __version__
+from crimson.cli import main
+from .utils import get_test_path
+
+# Upper bound of the time spent importing crimson.cli, on top of importing
+# click itself, in microseconds.
+IMPORT_BUDGET_US = 100_000
+
+FLAGSTAT_SCRIPT = """
+import sys
+from crimson.cli import main
+main(["flagstat", sys.argv[1]], standalone_mode=False)
+print(" ".join(sorted(sys.modules)), file=sys.stderr)
+"""
+
+
+def run_python(*args):
+    env = {**os.environ, "PYTHONPATH": dirname(dirname(__file__))}
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, check=True, env=env, text=True
+    )
+
+
+def test_version():
+    result = CliRunner().invoke(main, ["--version"])
+    assert result.exit_code == 0
+    assert result.output == f"{__version__}\n"
+
+
+def test_flagstat_imports():
+    result = run_python(
+        "-c", FLAGSTAT_SCRIPT, get_test_path("samtools_flagstat_v11_01.txt")
+    )
+    modules = set(result.stderr.split())
+    assert "crimson.flagstat" in modules
+    unexpected = {
+        "crimson.fastqc",
+        "crimson.fusioncatcher",
+        "crimson.picard",
+        "crimson.samtools_stats",
+        "crimson.star",
+        "crimson.star_fusion",
+        "crimson.vep",
+        "importlib.metadata",
+        "yaml",
+        "zipfile",
+    }
+    assert not modules & unexpected
+
+
+def test_import_budget():
+    result = run_python("-X", "importtime", "-c", "import crimson.cli")
+    cumulative = {}
+    # Skip the header line; the rest look like "import time: <self> | <cumul> | <name>"
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative_us, name = line.split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    assert cumulative["crimson.cli"] - cumulative["click"] < IMPORT_BUDGET_US
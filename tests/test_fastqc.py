@@ -5,11 +5,16 @@
 
 import json
 import os
+import shutil
+from io import StringIO
 
 import pytest
+from click import BadParameter
 from click.testing import CliRunner
 
+from crimson import fastqc, utils
 from crimson.cli import main
+from crimson.fastqc import FastQCModule
 from .utils import get_test_path, getattr_nested
 
 
@@ -323,3 +328,267 @@ def test_fastqc_zip_not_fastqc(fastqc_zip_not_fastqc):
     assert fastqc_zip_not_fastqc.exit_code != 0
     print(dir(fastqc_zip_not_fastqc))
     assert "contains an unexpected number of" in fastqc_zip_not_fastqc.output
+
+
+def test_fastqc_modules():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0101_01.txt")
+    full = json.loads(runner.invoke(main, ["fastqc", in_file]).output)
+    result = runner.invoke(
+        main,
+        [
+            "fastqc",
+            "--modules",
+            "Basic Statistics, Per base sequence quality",
+            in_file,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    assert payload["version"] == full["version"]
+    assert payload["Basic Statistics"] == full["Basic Statistics"]
+    assert payload["Per base sequence quality"] == full["Per base sequence quality"]
+    assert "Overrepresented sequences" not in payload
+    assert len(payload) == 3
+
+
+def test_fastqc_modules_zip():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0101_02.fq_fastqc.zip")
+    result = runner.invoke(main, ["fastqc", "--modules", "Kmer Content", in_file])
+    assert result.exit_code == 0, result.output
+    assert set(json.loads(result.output)) == {"version", "Kmer Content"}
+
+
+def test_fastqc_modules_unknown():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0101_01.txt")
+    result = runner.invoke(main, ["fastqc", "--modules", "Nope", in_file])
+    assert result.exit_code != 0
+    assert "Unknown FastQC module(s): Nope." in result.output
+
+
+def test_fastqc_module_lazy():
+    raw_lines = [
+        ">>Sequence Duplication Levels\tpass\n",
+        "#Total Deduplicated Percentage\t99.5\n",
+        "#Duplication Level\tPercentage of deduplicated\tPercentage of total\n",
+        "1\t99.7\t99.2\n",
+        ">>END_MODULE\n",
+    ]
+    module = FastQCModule(raw_lines)
+    assert module.name == "Sequence Duplication Levels"
+    assert module.status == "pass"
+    assert module.raw_lines is raw_lines
+
+    assert module.dict == {
+        "contents": [
+            {
+                "Duplication Level": 1,
+                "Percentage of deduplicated": 99.7,
+                "Percentage of total": 99.2,
+            }
+        ],
+        "status": "pass",
+        "Total Deduplicated Percentage": 99.5,
+    }
+    assert module.raw_lines is None
+    assert module.extra == {"Total Deduplicated Percentage": 99.5}
+    assert not hasattr(module, "__dict__")
+
+
+def test_fastqc_module_bad_end_mark():
+    with pytest.raises(ValueError, match="expected end mark"):
+        FastQCModule([">>Basic Statistics\tpass\n", "#Measure\tValue\n"])
+
+
+def test_fastqc_parse_handles():
+    exp = fastqc.parse(get_test_path("fastqc_v0101_02.txt"))
+    with open(get_test_path("fastqc_v0101_02.fq_fastqc.zip"), "rb") as src:
+        assert fastqc.parse(src) == exp
+    with open(get_test_path("fastqc_v0101_02.txt")) as src:
+        assert fastqc.parse(src) == exp
+
+
+@pytest.fixture
+def fastqc_many_dir(tmp_path):
+    zip_path = get_test_path("fastqc_v0101_02.fq_fastqc.zip")
+    data_path = get_test_path("fastqc_v0101_01.txt")
+    shutil.copy(zip_path, tmp_path / "a_fastqc.zip")
+    (tmp_path / "b_fastqc").mkdir()
+    shutil.copy(data_path, tmp_path / "b_fastqc" / "fastqc_data.txt")
+    # Extracted results take precedence over zipped ones.
+    shutil.copy(zip_path, tmp_path / "b_fastqc.zip")
+    (tmp_path / "c.txt").write_text("not a FastQC result")
+    return tmp_path
+
+
+def test_find_results(fastqc_many_dir):
+    assert fastqc.find_results(fastqc_many_dir) == {
+        "a": str(fastqc_many_dir / "a_fastqc.zip"),
+        "b": str(fastqc_many_dir / "b_fastqc" / "fastqc_data.txt"),
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_many(fastqc_many_dir, jobs):
+    assert fastqc.parse_many(fastqc_many_dir, jobs=jobs) == {
+        "a": fastqc.parse(get_test_path("fastqc_v0101_02.txt")),
+        "b": fastqc.parse(get_test_path("fastqc_v0101_01.txt")),
+    }
+
+
+def test_parse_many_empty(tmp_path):
+    with pytest.raises(BadParameter, match="Cannot find any FastQC results"):
+        fastqc.parse_many(tmp_path)
+
+
+def test_fastqc_many(fastqc_many_dir):
+    runner = CliRunner()
+    result = runner.invoke(
+        main,
+        [
+            "fastqc",
+            "--many",
+            "--jobs",
+            "2",
+            "--modules",
+            "Basic Statistics",
+            str(fastqc_many_dir),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    assert list(payload) == ["a", "b"]
+    assert payload["b"]["Basic Statistics"]["contents"]["Filename"] == (
+        "/home/crimson/fastqc/input.fq.gz"
+    )
+
+
+def test_fastqc_many_not_dir():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0101_01.txt")
+    result = runner.invoke(main, ["fastqc", "--many", in_file])
+    assert result.exit_code != 0
+    assert "INPUT must be a directory with --many." in result.output
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_parse_columnar(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(utils, "_get_numpy", lambda: None)
+    in_file = get_test_path("fastqc_v0101_02.txt")
+    rows = fastqc.parse(in_file)
+    columnar = fastqc.parse(in_file, columnar=True)
+
+    assert columnar.keys() == rows.keys()
+    assert columnar["Basic Statistics"] == rows["Basic Statistics"]
+    for name, module in rows.items():
+        if name in ("version", "Basic Statistics"):
+            continue
+        assert columnar[name].keys() == module.keys()
+        assert columnar[name]["status"] == module["status"]
+        for col, values in columnar[name]["contents"].items():
+            assert list(values) == [row[col] for row in module["contents"]]
+
+    quality = columnar["Per base sequence quality"]["contents"]
+    assert isinstance(quality["Base"], list)
+    assert not isinstance(quality["Mean"], list)
+
+
+def test_fastqc_columnar():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0101_02.txt")
+    result = runner.invoke(main, ["fastqc", "--columnar", in_file])
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    contents = payload["Per base sequence quality"]["contents"]
+    assert contents["Base"][:2] == ["1", "2"]
+    assert len(contents["Mean"]) == len(contents["Base"])
+
+
+@pytest.fixture(scope="module")
+def fastqc_v0119_01():
+    runner = CliRunner()
+    in_file = get_test_path("fastqc_v0119_01.txt")
+    result = runner.invoke(main, ["fastqc", in_file])
+    result.json = json.loads(result.output)
+    return result
+
+
+def test_fastqc_v0119_01_exit_code(fastqc_v0119_01):
+    assert fastqc_v0119_01.exit_code == 0
+
+
+@pytest.mark.parametrize(
+    "attrs, exp",
+    [
+        (["version"], "0.11.9"),
+        (["Basic Statistics", "contents", "Sequences flagged as poor quality"], 0),
+        (["Per base sequence quality", "contents", 9, "Base"], "10-11"),
+        (["Per tile sequence quality", "status"], "warn"),
+        (["Per tile sequence quality", "contents", "Tile", 0], 1101),
+        (["Per tile sequence quality", "contents", "Tile", 29], 1102),
+        (["Per tile sequence quality", "contents", "Base", 9], "10-11"),
+        (["Per tile sequence quality", "contents", "Base", 31], "3"),
+        (["Per tile sequence quality", "contents", "Mean", 31], -1.152787724338),
+        (["Per tile sequence quality", "contents", "Mean", 116], None),
+        (["Sequence Duplication Levels", "Total Deduplicated Percentage"], 91.3452),
+        (["Overrepresented sequences", "status"], "pass"),
+        (["Overrepresented sequences", "contents"], []),
+        (["Adapter Content", "status"], "pass"),
+        (["Adapter Content", "contents", 9, "Position"], "10-11"),
+        (
+            ["Adapter Content", "contents", 9, "Illumina Universal Adapter"],
+            0.04722704577633623,
+        ),
+        (["Adapter Content", "contents", 9, "SOLID Small RNA Adapter"], 0.0),
+        (["Adapter Content", "contents", 29], None),
+        (["Kmer Content"], None),
+    ],
+)
+def test_fastqc_v0119_01(fastqc_v0119_01, attrs, exp):
+    ori_attrs = list(attrs)
+    assert getattr_nested(fastqc_v0119_01.json, attrs) == exp, ", ".join(
+        [repr(x) for x in ori_attrs]
+    )
+
+
+def test_parse_per_tile_scaled():
+    n_tiles, bases = 500, [str(i) for i in range(1, 10)] + [
+        f"{i}-{i + 1}" for i in range(10, 150, 2)
+    ]
+    lines = [
+        "##FastQC\t0.11.9",
+        ">>Per tile sequence quality\tpass",
+        "#Tile\tBase\tMean",
+    ]
+    for tile in range(n_tiles):
+        for pos, base in enumerate(bases):
+            lines.append(f"{1101 + tile}\t{base}\t{(tile - pos) / 8}")
+    lines.append(">>END_MODULE")
+
+    payload = fastqc.parse(StringIO("\n".join(lines) + "\n"), max_size=2**30)
+    contents = payload["Per tile sequence quality"]["contents"]
+
+    n_rows = n_tiles * len(bases)
+    assert n_rows == 39_500
+    assert [len(values) for values in contents.values()] == [n_rows] * 3
+    assert contents["Base"] == bases * n_tiles
+    assert not isinstance(contents["Tile"], list)
+    assert contents["Tile"][-1] == 1100 + n_tiles
+    assert contents["Mean"][len(bases) + 2] == (1 - 2) / 8
+
+
+def test_fastqc_module_columnar_ragged():
+    raw_lines = [
+        ">>Per tile sequence quality\tpass\n",
+        "#Tile\tBase\tMean\n",
+        "1101\t1\t0.5\n",
+        "1101\t2\n",
+        ">>END_MODULE\n",
+    ]
+    with pytest.raises(ValueError, match="unexpected number of columns"):
+        FastQCModule(raw_lines).contents
@@ -4,10 +4,13 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import json
+from io import StringIO
 
 import pytest
+from click import BadParameter
 from click.testing import CliRunner
 
+from crimson import flagstat
 from crimson.cli import main
 from .utils import get_test_path
 
@@ -137,3 +140,144 @@ def test_flagstat_v11_01_pass_qc(flagstat_v11_01, attr, exp):
 )
 def test_flagstat_v11_01_fail_qc(flagstat_v11_01, attr, exp):
     assert flagstat_v11_01.json.get("fail_qc", {}).get(attr) == exp
+
+
+V117_01_PASS_QC = {
+    "total": 2185926,
+    "primary": 2160108,
+    "secondary": 20411,
+    "supplementary": 5407,
+    "duplicates": 311250,
+    "primary_duplicates": 311250,
+    "mapped": 2157211,
+    "primary_mapped": 2131393,
+    "paired_sequencing": 2160108,
+    "read1": 1080054,
+    "read2": 1080054,
+    "paired_proper": 2098652,
+    "paired": 2124880,
+    "singleton": 6513,
+    "diff_chrom": 18640,
+    "diff_chrom_mapq": 11218,
+}
+
+V117_01_FAIL_QC = {
+    "total": 1204,
+    "primary": 1198,
+    "secondary": 6,
+    "supplementary": 0,
+    "duplicates": 97,
+    "primary_duplicates": 97,
+    "mapped": 1127,
+    "primary_mapped": 1121,
+    "paired_sequencing": 1198,
+    "read1": 599,
+    "read2": 599,
+    "paired_proper": 1050,
+    "paired": 1094,
+    "singleton": 27,
+    "diff_chrom": 12,
+    "diff_chrom_mapq": 9,
+}
+
+
+@pytest.mark.parametrize(
+    "bname",
+    [
+        "samtools_flagstat_v117_01.txt",
+        "samtools_flagstat_v117_01.tsv",
+        "samtools_flagstat_v117_01.json",
+    ],
+)
+def test_flagstat_v117_01(bname):
+    runner = CliRunner()
+    result = runner.invoke(main, ["flagstat", get_test_path(bname)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output) == {
+        "pass_qc": V117_01_PASS_QC,
+        "fail_qc": V117_01_FAIL_QC,
+    }
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        "",
+        "{}",
+        '{"QC-passed reads": [1, 2]}',
+        "{not json",
+        "14152593 - 0 in total\n",
+        "total\t14152593\n",
+    ],
+)
+def test_parse_raises(contents):
+    with pytest.raises(BadParameter, match="Cannot parse input flagstat file."):
+        flagstat.parse(StringIO(contents))
+
+
+COHORT_FILES = [
+    "samtools_flagstat_v0119_01.txt",
+    "samtools_flagstat_v11_01.txt",
+    "samtools_flagstat_v117_01.json",
+]
+
+
+@pytest.fixture
+def cohort_list(tmp_path):
+    path = tmp_path / "inputs.txt"
+    path.write_text("\n".join(get_test_path(bname) for bname in COHORT_FILES) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_many(jobs):
+    payload = flagstat.parse_many([get_test_path(b) for b in COHORT_FILES], jobs)
+    assert payload["sample"] == [
+        "samtools_flagstat_v0119_01",
+        "samtools_flagstat_v11_01",
+        "samtools_flagstat_v117_01",
+    ]
+    assert payload["pass_qc"]["total"] == [14152593, 71511, 2185926]
+    assert payload["pass_qc"]["primary"] == [None, None, 2160108]
+    assert payload["pass_qc"]["secondary"] == [None, 122, 20411]
+    assert payload["fail_qc"]["diff_chrom_mapq"] == [0, 0, 9]
+    assert {len(v) for v in payload["pass_qc"].values()} == {3}
+
+
+def test_parse_many_duplicate_samples():
+    in_file = get_test_path("samtools_flagstat_v117_01.txt")
+    with pytest.raises(BadParameter, match="is not unique"):
+        flagstat.parse_many([in_file, get_test_path("samtools_flagstat_v117_01.tsv")])
+
+
+def test_parse_many_invalid():
+    in_file = get_test_path("samtools_flagstat_nope.txt")
+    with pytest.raises(BadParameter, match="samtools_flagstat_nope.txt: Cannot parse"):
+        flagstat.parse_many([in_file])
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_flagstat_cohort_tsv(cohort_list, jobs):
+    runner = CliRunner()
+    result = runner.invoke(
+        main, ["flagstat", "--cohort", "tsv", "--jobs", jobs, str(cohort_list)]
+    )
+    assert result.exit_code == 0, result.output
+    header, *rows = [line.split("\t") for line in result.output.splitlines()]
+    assert header[:3] == ["sample", "pass_qc.total", "pass_qc.primary"]
+    assert len(header) == 33
+    assert [row[:3] for row in rows] == [
+        ["samtools_flagstat_v0119_01", "14152593", ""],
+        ["samtools_flagstat_v11_01", "71511", ""],
+        ["samtools_flagstat_v117_01", "2185926", "2160108"],
+    ]
+
+
+def test_flagstat_cohort_json(cohort_list):
+    runner = CliRunner()
+    result = runner.invoke(
+        main, ["--fmt", "yaml", "flagstat", "--cohort", "json", str(cohort_list)]
+    )
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    assert payload == flagstat.parse_many([get_test_path(b) for b in COHORT_FILES])
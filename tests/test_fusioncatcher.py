@@ -4,11 +4,20 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import json
+from io import StringIO
 
 import pytest
+import yaml
+from click import BadParameter
 from click.testing import CliRunner
 
 from crimson.cli import main
+from crimson.fusioncatcher import (
+    compile_decoder,
+    detect_format,
+    parse,
+    parse_raw_line,
+)
 from .utils import get_test_path, getattr_nested
 
 
@@ -202,3 +211,68 @@ def test_fusioncatcher_v100(fusioncatcher_v100, attrs, exp_v100):
 def test_fusioncatcher_v120_empty(fusioncatcher_v120_empty):
     err_msg = "Unexpected column names:"
     assert err_msg not in fusioncatcher_v120_empty.output
+
+
+@pytest.mark.parametrize(
+    "bname",
+    ["fusioncatcher_v0995a.txt", "fusioncatcher_v100.txt"],
+)
+def test_fusioncatcher_ndjson(bname):
+    runner = CliRunner()
+    in_file = get_test_path(bname)
+    result = runner.invoke(main, ["fusioncatcher", "--ndjson", in_file])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert records == json.loads(runner.invoke(main, ["fusioncatcher", in_file]).output)
+
+
+def test_fusioncatcher_multi_doc():
+    runner = CliRunner()
+    in_file = get_test_path("fusioncatcher_v100.txt")
+    result = runner.invoke(main, ["fusioncatcher", "--multi-doc", in_file])
+    assert result.exit_code == 0
+    records = list(yaml.safe_load_all(result.output))
+    assert records == json.loads(runner.invoke(main, ["fusioncatcher", in_file]).output)
+
+
+def test_compile_decoder_cached():
+    with open(get_test_path("fusioncatcher_v100.txt")) as src:
+        colnames = tuple(next(src).strip().split("\t"))
+        line = next(src)
+    assert compile_decoder(colnames) is compile_decoder(colnames)
+    assert parse_raw_line(line, list(colnames)) == compile_decoder(colnames)(line)
+
+
+@pytest.mark.parametrize(
+    "bname, exp",
+    [
+        ("fusioncatcher_v0995a.txt", "0.99.5a"),
+        ("fusioncatcher_v100.txt", "1.00"),
+        ("fusioncatcher_v120_empty.txt", "1.20-empty"),
+    ],
+)
+def test_detect_format(bname, exp):
+    with open(get_test_path(bname)) as src:
+        assert detect_format(next(src).strip().split("\t")) == exp
+
+
+def test_detect_format_raises():
+    with pytest.raises(BadParameter):
+        detect_format(["Wrong", "column", "names"])
+
+
+def test_parse_raw_line_raises():
+    with open(get_test_path("fusioncatcher_v100.txt")) as src:
+        colnames = next(src).strip().split("\t")
+    with pytest.raises(BadParameter):
+        parse_raw_line("Wrong raw line", colnames)
+
+
+def test_parse_v120_empty_data_line_raises():
+    with open(get_test_path("fusioncatcher_v120_empty.txt")) as src:
+        header = src.readline()
+    n_cols = len(header.split("\t"))
+    in_data = StringIO(header + "\t".join(["x"] * n_cols) + "\n")
+    assert parse(get_test_path("fusioncatcher_v120_empty.txt")) == []
+    with pytest.raises(BadParameter, match="do not contain"):
+        parse(in_data)
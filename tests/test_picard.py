@@ -4,11 +4,25 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import json
+import shutil
+from io import StringIO
 
 import pytest
 from click.testing import CliRunner
 
 from crimson.cli import main
+from click import BadParameter
+
+from crimson.picard import (
+    densify_histogram,
+    find_prefix,
+    parse,
+    parse_header,
+    parse_histogram,
+    parse_cohort,
+    parse_metrics,
+    parse_prefix,
+)
 from .utils import get_test_path, getattr_nested
 
 
@@ -335,3 +349,256 @@ def test_wgs_v1124_01(wgs_v1124_01, attrs, exp):
     assert getattr_nested(wgs_v1124_01.json, attrs) == exp, ", ".join(
         [repr(x) for x in attrs]
     )
+
+
+def read_case(bname):
+    with open(get_test_path(bname)) as src:
+        return src.read()
+
+
+@pytest.mark.parametrize(
+    "bname",
+    [
+        "picard_alignment_summary_v1124_01.txt",
+        "picard_insert_size_v1124_01.txt",
+        "picard_wgs_v1124_01.txt",
+    ],
+)
+def test_parse_crlf(bname):
+    contents = read_case(bname)
+    crlf = StringIO(contents.replace("\n", "\r\n"))
+    assert parse(crlf) == parse(StringIO(contents))
+
+
+def test_parse_large_histogram():
+    header, _ = read_case("picard_wgs_v1124_01.txt").split("## HISTOGRAM")
+    n_bins = 200_000
+    rows = "".join(f"{idx}\t{idx % 7}\n" for idx in range(n_bins))
+    contents = f"{header}## HISTOGRAM\tjava.lang.Integer\ncoverage\tcount\n{rows}"
+    assert len(contents) > 1024 * 1024
+    histogram = parse(StringIO(contents))["histogram"]["contents"]
+    assert len(histogram) == n_bins
+    assert histogram[-1] == {"coverage": n_bins - 1, "count": (n_bins - 1) % 7}
+
+
+def test_parse_sections_from_strings():
+    sections = read_case("picard_insert_size_v1124_01.txt").strip().split("\n\n")
+    parsed = parse(get_test_path("picard_insert_size_v1124_01.txt"))
+    assert parse_header(sections[0], "\n") == parsed["header"]
+    assert parse_metrics(sections[1], "\n") == parsed["metrics"]
+    assert parse_histogram(sections[2]) == parsed["histogram"]
+
+
+def test_parse_header_raises():
+    with pytest.raises(ValueError):
+        parse_header(["## htsjdk.samtools.metrics.StringHeader"])
+
+
+HISTOGRAM_HEADER = """## htsjdk.samtools.metrics.StringHeader
+# picard.analysis.CollectWgsMetrics
+## htsjdk.samtools.metrics.StringHeader
+# Started on: Sun Jul 19 15:42:28 CEST 2015
+
+## HISTOGRAM\tjava.lang.Integer
+"""
+
+
+@pytest.mark.parametrize(
+    "bname",
+    [
+        "picard_insert_size_v1124_01.txt",
+        "picard_rna_seq_v1124_01.txt",
+        "picard_wgs_v1124_01.txt",
+    ],
+)
+@pytest.mark.parametrize("encoding", ["columns", "sparse"])
+def test_densify_histogram(bname, encoding):
+    in_file = get_test_path(bname)
+    dense = parse(in_file)["histogram"]["contents"]
+    contents = parse(in_file, histogram=encoding)["histogram"]["contents"]
+    assert json.dumps(densify_histogram(contents)) == json.dumps(dense)
+
+
+@pytest.mark.parametrize(
+    "table, exp_rows, exp_runs",
+    [
+        (
+            [(0, 0), (1, 5), (2, 0), (3, 0), (5, 0), (6, 2)],
+            [[1, 5], [6, 2]],
+            [[0, 1], [2, 2], [5, 1]],
+        ),
+        ([(0, 1.5), (1, 0.0), (2, 0)], [[0, 1.5], [1, 0.0]], [[2, 1]]),
+        ([(1, 5), (2, 0), (0, 0), (3, 0)], [[1, 5], [2, 0], [0, 0], [3, 0]], []),
+        ([("a", 0), (1, 0)], [["a", 0], [1, 0]], []),
+    ],
+)
+def test_parse_histogram_sparse(table, exp_rows, exp_runs):
+    rows = "".join(f"{bin_value}\t{count}\n" for bin_value, count in table)
+    contents = f"{HISTOGRAM_HEADER}bin\tcount\n{rows}"
+    dense = parse(StringIO(contents))["histogram"]["contents"]
+    sparse = parse(StringIO(contents), histogram="sparse")["histogram"]["contents"]
+    assert sparse == {
+        "columns": ["bin", "count"],
+        "rows": exp_rows,
+        "zero_runs": exp_runs,
+    }
+    assert densify_histogram(sparse) == dense
+
+
+def test_parse_histogram_columns():
+    in_file = get_test_path("picard_insert_size_v1124_01.txt")
+    contents = parse(in_file, histogram="columns")["histogram"]["contents"]
+    assert list(contents) == ["insert_size", "All_Reads.fr_count"]
+    assert contents["insert_size"][0] == 13
+    assert len(contents["All_Reads.fr_count"]) == 581
+
+
+def test_parse_histogram_columns_mixed_types():
+    contents = f"{HISTOGRAM_HEADER}bin\tcount\n0\t1\n1\t0.5\n"
+    columns = parse(StringIO(contents), histogram="columns")["histogram"]["contents"]
+    assert columns["count"] == [1, 0.5]
+
+
+def test_parse_histogram_raises():
+    with pytest.raises(BadParameter):
+        parse(get_test_path("picard_wgs_v1124_01.txt"), histogram="dense")
+    with pytest.raises(BadParameter):
+        parse_histogram(["## HISTOGRAM", "bin\tcount", "0\t1\t2"], encoding="columns")
+
+
+def test_picard_histogram_sparse():
+    runner = CliRunner()
+    in_file = get_test_path("picard_wgs_v1124_01.txt")
+    result = runner.invoke(main, ["picard", "--histogram", "sparse", in_file])
+    assert result.exit_code == 0
+    contents = json.loads(result.output)["histogram"]["contents"]
+    assert contents["zero_runs"] == [[9, 242]]
+    assert densify_histogram(contents) == parse(in_file)["histogram"]["contents"]
+
+
+@pytest.fixture
+def picard_prefix(tmp_path):
+    for bname, suffix in [
+        ("picard_alignment_summary_v1124_01.txt", "alignment_summary_metrics"),
+        ("picard_insert_size_v1124_01.txt", "insert_size_metrics"),
+        # Files of another prefix are left out.
+        ("picard_wgs_v1124_01.txt", "dedup.wgs_metrics"),
+    ]:
+        shutil.copy(get_test_path(bname), tmp_path / f"s[1].{suffix}")
+    contents = f"{HISTOGRAM_HEADER}QUALITY\tCOUNT_OF_Q\n30\t5\n"
+    (tmp_path / "s[1].quality_distribution_metrics").write_text(contents)
+    (tmp_path / "s[1].quality_distribution.pdf").write_text("not a metrics file")
+    return str(tmp_path / "s[1]")
+
+
+def test_find_prefix(picard_prefix):
+    assert find_prefix(picard_prefix) == [
+        f"{picard_prefix}.alignment_summary_metrics",
+        f"{picard_prefix}.insert_size_metrics",
+        f"{picard_prefix}.quality_distribution_metrics",
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_prefix(picard_prefix, jobs):
+    payload = parse_prefix(picard_prefix, jobs=jobs)
+    assert list(payload) == [
+        "picard.analysis.AlignmentSummaryMetrics",
+        "picard.analysis.InsertSizeMetrics",
+        "quality_distribution_metrics",
+    ]
+    assert payload["picard.analysis.InsertSizeMetrics"] == parse(
+        get_test_path("picard_insert_size_v1124_01.txt")
+    )
+    assert payload["quality_distribution_metrics"]["histogram"]["contents"] == [
+        {"QUALITY": 30, "COUNT_OF_Q": 5}
+    ]
+
+
+def test_parse_prefix_raises(picard_prefix, tmp_path):
+    with pytest.raises(BadParameter, match="Cannot find any Picard metrics"):
+        parse_prefix(str(tmp_path / "s2"))
+    shutil.copy(
+        get_test_path("picard_insert_size_v1124_01.txt"),
+        f"{picard_prefix}.other_metrics",
+    )
+    with pytest.raises(BadParameter, match="is not unique"):
+        parse_prefix(picard_prefix)
+
+
+def test_picard_prefix(picard_prefix):
+    runner = CliRunner()
+    args = ["picard", "--prefix", "--jobs", "2", "--histogram", "sparse"]
+    result = runner.invoke(main, [*args, picard_prefix])
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    assert set(payload) == {
+        "picard.analysis.AlignmentSummaryMetrics",
+        "picard.analysis.InsertSizeMetrics",
+        "quality_distribution_metrics",
+    }
+    histogram = payload["picard.analysis.InsertSizeMetrics"]["histogram"]
+    assert "zero_runs" in histogram["contents"]
+
+
+def test_picard_missing_input(tmp_path):
+    result = CliRunner().invoke(main, ["picard", str(tmp_path / "nope")])
+    assert result.exit_code != 0
+    assert "does not exist" in result.output
+
+
+@pytest.fixture
+def picard_cohort(tmp_path):
+    src = get_test_path("picard_alignment_summary_v1124_01.txt")
+    paths = []
+    for sample in ["s1", "s2"]:
+        paths.append(str(tmp_path / f"{sample}.alignment_summary_metrics"))
+        shutil.copy(src, paths[-1])
+    return paths
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_cohort(picard_cohort, jobs):
+    payload = parse_cohort(picard_cohort, jobs)
+    rows = parse(picard_cohort[0])["metrics"]["contents"]
+    assert payload["class"] == "picard.analysis.AlignmentSummaryMetrics"
+    assert payload["sample"] == ["s1"] * len(rows) + ["s2"] * len(rows)
+    assert list(payload["columns"]) == list(rows[0])
+    for name, column in payload["columns"].items():
+        assert list(column) == [row[name] for row in rows] * 2
+
+
+def test_parse_cohort_typed_columns(picard_cohort):
+    columns = parse_cohort(picard_cohort)["columns"]
+    assert not isinstance(columns["TOTAL_READS"], list)
+    assert isinstance(columns["CATEGORY"], list)
+
+
+def test_parse_cohort_raises(picard_cohort):
+    with pytest.raises(BadParameter, match="does not match the class"):
+        parse_cohort(picard_cohort + [get_test_path("picard_wgs_v1124_01.txt")])
+    with pytest.raises(BadParameter, match="not unique"):
+        parse_cohort(picard_cohort * 2)
+    with pytest.raises(BadParameter, match="No Picard metrics files"):
+        parse_cohort([])
+
+
+def test_picard_cohort(picard_cohort, tmp_path):
+    in_file = tmp_path / "inputs.txt"
+    in_file.write_text("\n".join(picard_cohort) + "\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["picard", "--cohort", "--jobs", "2", str(in_file)])
+    assert result.exit_code == 0, result.output
+    payload = json.loads(result.output)
+    assert payload["sample"] == ["s1"] * 3 + ["s2"] * 3
+    assert (
+        payload["columns"]["CATEGORY"]
+        == ["FIRST_OF_PAIR", "SECOND_OF_PAIR", "PAIR"] * 2
+    )
+
+
+def test_picard_cohort_with_prefix(tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(main, ["picard", "--cohort", "--prefix", str(tmp_path)])
+    assert result.exit_code != 0
+    assert "--prefix" in result.output
@@ -0,0 +1,128 @@
+"""samtools-stats subcommand tests"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+from io import StringIO
+
+import pytest
+from click import BadParameter
+from click.testing import CliRunner
+
+from crimson import samtools_stats, utils
+from crimson.cli import main
+from .utils import get_test_path, getattr_nested
+
+
+@pytest.fixture(scope="module")
+def samtools_stats_fail():
+    runner = CliRunner()
+    in_file = get_test_path("samtools_flagstat_v11_01.txt")
+    result = runner.invoke(main, ["samtools-stats", in_file])
+    return result
+
+
+@pytest.fixture(scope="module")
+def samtools_stats_v117_01():
+    runner = CliRunner()
+    in_file = get_test_path("samtools_stats_v117_01.txt")
+    result = runner.invoke(main, ["samtools-stats", in_file])
+    result.json = json.loads(result.output)
+    return result
+
+
+def test_samtools_stats_fail_exit_code(samtools_stats_fail):
+    assert samtools_stats_fail.exit_code != 0
+
+
+def test_samtools_stats_fail_output(samtools_stats_fail):
+    err_msg = "Cannot parse input samtools stats file."
+    assert err_msg in samtools_stats_fail.output
+
+
+def test_samtools_stats_v117_01_exit_code(samtools_stats_v117_01):
+    assert samtools_stats_v117_01.exit_code == 0
+
+
+@pytest.mark.parametrize(
+    "attrs, exp",
+    [
+        (["version"], "1.17+htslib-1.17"),
+        (["CHK"], ["5e0b8e25", "6d5c7b33", "a1b30e7b"]),
+        (["SN", "raw total sequences"], 2000),
+        (["SN", "error rate"], 2.303657e-03),
+        (["SN", "average quality"], 36.2),
+        (["SN", "percentage of properly paired reads (%)"], 97.0),
+        (["FFQ", "cycle", 0], 1),
+        (["FFQ", "counts", 0, 26], 1),
+        (["FFQ", "counts", 0, 41], 43),
+        (["FFQ", "counts", 10], None),
+        (["LFQ", "cycle", 9], 10),
+        (["LFQ", "counts", 9, 24], 1),
+        (["LFQ", "counts", 9, 41], 56),
+        (["GCC", "cycle", 2], 3),
+        (["GCC", "O", 2], 0.0),
+        (["GCT", "N"], None),
+        (["IS", "insert_size", 2], 100),
+        (["IS", "pairs_total", 2], 32),
+        (["RL", "length"], [100]),
+        (["MAPQ", "mapq"], [0, 27, 60]),
+        (["ID", "deletions", 2], 1),
+        (["IC", "insertions_rev", 5], 2),
+        (["COV", "range", 5], "[1000<]"),
+        (["COV", "depth", 5], 1000),
+        (["GCD", "gc", 2], 50.0),
+        (["GCD", "unique_percentile", 2], 24.355),
+        (["GCD", "p90", 2], 0.056),
+    ],
+)
+def test_samtools_stats_v117_01(samtools_stats_v117_01, attrs, exp):
+    ori_attrs = list(attrs)
+    assert getattr_nested(samtools_stats_v117_01.json, attrs) == exp, ", ".join(
+        [repr(x) for x in ori_attrs]
+    )
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_parse_arrays(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(utils, "_get_numpy", lambda: None)
+    payload = samtools_stats.parse(get_test_path("samtools_stats_v117_01.txt"))
+
+    counts = payload["FFQ"]["counts"]
+    assert len(counts) == 10
+    assert [len(row) for row in counts] == [42] * 10
+    assert not isinstance(payload["IS"]["insert_size"], list)
+    assert isinstance(payload["COV"]["range"], list)
+    if numpy:
+        assert counts.shape == (10, 42)
+
+
+def test_parse_unknown_and_short_rows():
+    contents = "\n".join(
+        [
+            "FFQ\t1\t0\t5\t7",
+            "FFQ\t2\t1\t4",
+            "XYZ\t1\ta",
+            "XYZ\t2\tb",
+        ]
+    )
+    payload = samtools_stats.parse(StringIO(contents))
+    assert [list(row) for row in payload["FFQ"]["counts"]] == [[0, 5, 7], [1, 4, 0]]
+    assert [list(col) for col in payload["XYZ"]] == [[1, 2], ["a", "b"]]
+
+
+@pytest.mark.parametrize(
+    "contents, msg",
+    [
+        ("# only comments\n", "Cannot parse input samtools stats file."),
+        ("IS\t0\t1\t1\t0\t0\nIS\t1\t1\n", "different numbers of columns"),
+        ("FFQ\t1\t0\tx\n", "non-integer counts"),
+    ],
+)
+def test_parse_raises(contents, msg):
+    with pytest.raises(BadParameter, match=msg):
+        samtools_stats.parse(StringIO(contents))
@@ -6,15 +6,21 @@
 import json
 
 import pytest
+import yaml
 from click import BadParameter
 from click.testing import CliRunner
 
 from crimson.cli import main
 from crimson.star_fusion import (
+    ReadNames,
+    compile_decoder,
     detect_format,
+    iter_records,
     parse_annots,
+    parse,
     parse_lr_entry,
     parse_raw_line,
+    split_read_name,
 )
 from .utils import get_test_path, getattr_nested
 
@@ -352,6 +358,138 @@ def test_detect_format_raises():
         detect_format(colnames="Wrong column names")
 
 
+def test_compile_decoder_cached():
+    assert compile_decoder("v1.6.0") is compile_decoder("v1.6.0")
+    assert compile_decoder("v1.6.0") is not compile_decoder("v1.6.0", False)
+
+
+def test_compile_decoder_raises():
+    decode = compile_decoder("v1.6.0_abr")
+    with pytest.raises(BadParameter):
+        decode("Wrong raw line")
+
+
+def test_compile_decoder_reads():
+    with open(get_test_path("star_fusion_v160_dummy.txt")) as src:
+        version = detect_format(next(src).strip()[1:].split("\t"))
+        record = compile_decoder(version, False)(next(src).strip())
+    assert list(record)[-3:] == ["left", "right", "reads"]
+    assert list(record["reads"]) == ["junctionReads", "spanningFrags"]
+
+
+@pytest.mark.parametrize(
+    "reads, exp",
+    [
+        ("count", {"junctionReads": 200, "spanningFrags": 101}),
+        (
+            "hashed",
+            {
+                "junctionReads": "7873d21a09460eb41a414df155cd3555",
+                "spanningFrags": "4d6ceab265ff988b93d515c4b5d10682",
+            },
+        ),
+    ],
+)
+def test_star_fusion_reads_modes(reads, exp):
+    runner = CliRunner()
+    in_file = get_test_path("star_fusion_v160_NB4.txt")
+    result = runner.invoke(main, ["star-fusion", "--reads", reads, in_file])
+    assert result.exit_code == 0
+    assert json.loads(result.output)[0]["reads"] == exp
+
+
+def test_star_fusion_reads_none():
+    records = parse(get_test_path("star_fusion_v160_dummy.txt"), reads="none")
+    assert all("reads" not in record for record in records)
+
+
+def test_star_fusion_reads_empty():
+    in_file = get_test_path("star_fusion_v160_dummy.txt")
+    full = parse(in_file)
+    counts = parse(in_file, reads="count")
+    for record, counted in zip(full, counts):
+        for key, names in record["reads"].items():
+            assert counted["reads"][key] == len(names)
+
+
+@pytest.mark.parametrize("fmt", ["json", "yaml"])
+def test_star_fusion_reads_compact(fmt):
+    runner = CliRunner()
+    in_file = get_test_path("star_fusion_v160_NB4.txt")
+    full = runner.invoke(main, ["--fmt", fmt, "star-fusion", in_file])
+    result = runner.invoke(
+        main, ["--fmt", fmt, "star-fusion", "--reads", "compact", in_file]
+    )
+    assert result.exit_code == 0
+    assert result.output == full.output
+
+
+@pytest.mark.parametrize(
+    "name, exp",
+    [
+        (
+            "A00123:45:HXXXXDSXX:1:1101:2912:27173",
+            ("A00123:45:HXXXXDSXX:1:", "1101:2912:27173"),
+        ),
+        ("SRR8615343.30281602", ("SRR8615343.", "30281602")),
+        ("read1", ("", "read1")),
+    ],
+)
+def test_split_read_name(name, exp):
+    assert split_read_name(name) == exp
+
+
+READ_NAMES = [
+    "A00123:45:HXXXXDSXX:1:1101:46:28791",
+    "A00123:45:HXXXXDSXX:2:1101:25019:4598",
+    "SRR8615343.30281602",
+    "A00123:45:HXXXXDSXX:1:1102:2912:27173",
+    "read1",
+]
+
+
+@pytest.mark.parametrize(
+    "names",
+    [
+        ReadNames(READ_NAMES),
+        ReadNames.from_column(",".join(READ_NAMES)),
+    ],
+)
+def test_read_names(names):
+    assert len(names) == len(READ_NAMES)
+    assert list(names) == READ_NAMES
+    assert names == READ_NAMES
+    assert names[0] == READ_NAMES[0]
+    assert names[-2] == READ_NAMES[-2]
+    assert names[1:3] == READ_NAMES[1:3]
+    assert names.index("SRR8615343.30281602") == 2
+    assert "read1" in names
+    with pytest.raises(IndexError):
+        names[len(READ_NAMES)]
+
+
+@pytest.mark.parametrize(
+    "column, exp",
+    [
+        (".", []),
+        ("SRR8615343.30281602", ["SRR8615343.30281602"]),
+        ("SRR1.1,SRR1.2,SRR1.3", ["SRR1.1", "SRR1.2", "SRR1.3"]),
+    ],
+)
+def test_read_names_from_column(column, exp):
+    assert ReadNames.from_column(column).tolist() == exp
+
+
+def test_read_names_raises():
+    with pytest.raises(ValueError):
+        ReadNames(["SRR1.1,SRR1.2"])
+
+
+def test_star_fusion_reads_raises():
+    with pytest.raises(BadParameter):
+        parse(get_test_path("star_fusion_v160_dummy.txt"), reads="some")
+
+
 def test_parse_annots_raises():
     with pytest.raises(RuntimeError):
         parse_annots("Does not start with [")
@@ -360,3 +498,34 @@ def test_parse_annots_raises():
 def test_star_fusion_v110(star_fusion_v110_abr):
     """Check that est_S has been cast to a float"""
     assert star_fusion_v110_abr.json[2]["est_S"] == 0.5
+
+
+@pytest.mark.parametrize(
+    "bname",
+    [
+        "star_fusion_v060_01.txt",
+        "star_fusion_v160_dummy.txt",
+        "star_fusion_v110_abr.txt",
+    ],
+)
+def test_star_fusion_ndjson(bname):
+    runner = CliRunner()
+    in_file = get_test_path(bname)
+    result = runner.invoke(main, ["star-fusion", "--ndjson", in_file])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert records == json.loads(runner.invoke(main, ["star-fusion", in_file]).output)
+
+
+def test_iter_records():
+    records = iter_records(get_test_path("star_fusion_v060_01.txt"))
+    assert next(records)["fusionName"] == "RUNX1--RUNX1T1"
+
+
+def test_star_fusion_multi_doc():
+    runner = CliRunner()
+    in_file = get_test_path("star_fusion_v160_dummy.txt")
+    result = runner.invoke(main, ["star-fusion", "--multi-doc", in_file])
+    assert result.exit_code == 0
+    records = list(yaml.safe_load_all(result.output))
+    assert records == json.loads(runner.invoke(main, ["star-fusion", in_file]).output)
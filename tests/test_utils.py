@@ -0,0 +1,214 @@
+"""utils module tests"""
+
+# Copyright (c) 2015-2022 Wibowo Arindrarto <contact@arindrarto.dev>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+from array import array
+from io import StringIO
+from os import linesep
+
+import pytest
+import yaml
+
+from crimson import utils
+from crimson.utils import (
+    as_array,
+    convert,
+    convert_column,
+    convert_rows,
+    get_json_encoder,
+    map_parallel,
+    write_output,
+    write_yaml_stream,
+)
+
+RECORDS = [
+    {"b": [1, 2.5, "x\ny"], "a": {"nested": None, "empty": []}},
+    {"c": "ü", "d": {}},
+]
+
+RAW_VALUES = [
+    "12",
+    "-12",
+    "+3",
+    "007",
+    "12L",
+    "12\n",
+    "1.5",
+    ".5",
+    "5.",
+    "-0.5",
+    "+.5",
+    "1.50",
+    "1e5",
+    "1.5e-3",
+    "1.2.3",
+    "12a",
+    "1_000",
+    " 12",
+    "0x1F",
+    "nan",
+    "inf",
+    "\u0661\u0662",
+    "\u00b2",
+    ".",
+    "-",
+    "",
+    "abc",
+]
+
+
+def typed(values):
+    return [(type(v), v) for v in values]
+
+
+@pytest.mark.parametrize("first", ["1", "1.5", "x"])
+@pytest.mark.parametrize("raw", RAW_VALUES)
+def test_convert_column(first, raw):
+    assert typed(convert_column([first, raw])) == typed([convert(first), convert(raw)])
+
+
+def test_convert_column_empty():
+    assert convert_column([]) == []
+
+
+@pytest.mark.parametrize("extra", [[], [["2", "3", "4.5"]]])
+def test_convert_rows(extra):
+    rows = [[first, raw] for first in ("1", "1.5", "x") for raw in RAW_VALUES]
+    rows.extend(extra)
+    exp = [[convert(v) for v in row] for row in rows]
+    assert [typed(row) for row in convert_rows(rows)] == [typed(row) for row in exp]
+
+
+def test_convert_rows_raw_cols():
+    rows = convert_rows([["1", "1-2"], ["2", "3"]], raw_cols={1})
+    assert [list(row) for row in rows] == [[1, "1-2"], [2, "3"]]
+
+
+@pytest.mark.parametrize("records", [RECORDS, RECORDS[:1], []])
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"compact": True},
+        {"indent": 0},
+        {"indent": 2},
+        {"indent": 4},
+    ],
+)
+def test_write_output_iterator(records, kwargs):
+    from_list, from_iter = StringIO(), StringIO()
+    write_output(records, from_list, **kwargs)
+    write_output(iter(records), from_iter, **kwargs)
+    assert from_iter.getvalue() == from_list.getvalue()
+
+
+@pytest.mark.parametrize(
+    "kwargs, exp",
+    [
+        ({"compact": True}, json.dumps(RECORDS, sort_keys=True, separators=(",", ":"))),
+        ({"indent": 2}, json.dumps(RECORDS, sort_keys=True, indent=2) + linesep),
+        ({"indent": 2, "sort_keys": False}, json.dumps(RECORDS, indent=2) + linesep),
+    ],
+)
+def test_write_output_json(kwargs, exp):
+    out = StringIO()
+    write_output(RECORDS, out, **kwargs)
+    assert out.getvalue() == exp
+
+
+@pytest.mark.parametrize("iterate", [False, True])
+@pytest.mark.parametrize("kwargs", [{"compact": True}, {"indent": 2}, {"indent": 4}])
+def test_write_output_orjson(iterate, kwargs):
+    pytest.importorskip("orjson")
+    out = StringIO()
+    payload = iter(RECORDS) if iterate else RECORDS
+    write_output(payload, out, json_backend="orjson", **kwargs)
+    assert json.loads(out.getvalue()) == RECORDS
+
+
+@pytest.mark.parametrize("backend", ["stdlib", "auto"])
+def test_get_json_encoder(backend):
+    encode = get_json_encoder(backend)
+    assert json.loads(encode(RECORDS, True, 0, True)) == RECORDS
+
+
+def test_get_json_encoder_raises():
+    with pytest.raises(ValueError):
+        get_json_encoder("nope")
+
+
+def test_write_output_yaml():
+    out = StringIO()
+    write_output(RECORDS, out, fmt="yaml", indent=2)
+    assert out.getvalue() == yaml.dump(RECORDS, default_flow_style=False, indent=2)
+
+
+def test_write_yaml_stream():
+    out = StringIO()
+    write_yaml_stream(iter(RECORDS), out)
+    assert list(yaml.safe_load_all(out.getvalue())) == RECORDS
+
+
+@pytest.fixture(params=["numpy", "array"])
+def array_backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(utils, "_get_numpy", lambda: None)
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "values, exp_kind",
+    [
+        ([1, 2, 3], "i"),
+        ([1, 2.5], "f"),
+        ([], "i"),
+        ([1, "x"], None),
+        ([2**64], None),
+    ],
+)
+def test_as_array(array_backend, values, exp_kind):
+    converted = as_array(values)
+    if exp_kind is None:
+        assert converted is values
+        return
+    assert list(converted) == values
+    if array_backend == "numpy":
+        assert converted.dtype.kind == exp_kind
+    else:
+        assert isinstance(converted, array)
+        assert converted.typecode == {"i": "q", "f": "d"}[exp_kind]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"compact": True},
+        {"indent": 2},
+        {"fmt": "yaml"},
+        pytest.param({"json_backend": "orjson", "indent": 2}, id="orjson"),
+    ],
+)
+def test_write_output_arrays(array_backend, kwargs):
+    if kwargs.get("json_backend") == "orjson":
+        pytest.importorskip("orjson")
+    payload = {"ints": [1, 2], "floats": [0.5, 1.0], "strs": ["a", "b"]}
+    columnar = {k: as_array(v) for k, v in payload.items()}
+    exp, out = StringIO(), StringIO()
+    write_output(payload, exp, **kwargs)
+    write_output(columnar, out, **kwargs)
+    assert out.getvalue() == exp.getvalue()
+
+
+def test_write_output_unsupported():
+    with pytest.raises(TypeError, match="object is not JSON serializable"):
+        write_output({"a": object()}, StringIO())
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("n_items", [0, 1, 500])
+def test_map_parallel(jobs, n_items):
+    items = list(range(n_items))
+    assert list(map_parallel(abs, [-x for x in items], jobs)) == items
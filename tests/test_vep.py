@@ -4,14 +4,16 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import json
+from io import StringIO
 
 import pytest
+import yaml
 from click.testing import CliRunner
 
 from crimson.cli import main
 from .utils import get_test_path, getattr_nested
 
-from crimson.vep import group2entry, parse_raw_value
+from crimson.vep import group2entry, parse, parse_raw_value
 
 
 @pytest.fixture(scope="module")
@@ -78,6 +80,15 @@ def test_vep_v97_headers(vep_v97_with_empty):
         assert header in vep_v97_with_empty.json
 
 
+def test_vep_v97_headers_yaml():
+    """Test if the empty headers are written as plain YAML mappings"""
+    runner = CliRunner()
+    in_file = get_test_path("vep_v97_with_empty.txt")
+    result = runner.invoke(main, ["--fmt", "yaml", "vep", in_file])
+    assert result.exit_code == 0
+    assert yaml.safe_load(result.output)["Coding consequences"] == {}
+
+
 def test_vep_group2entry():
     group = """ [Variant classes]
                 deletion\t18
@@ -111,3 +122,35 @@ def test_vep_group2entry_empty_section():
 def test_parse_raw_values_vep(raw, processed):
     values = parse_raw_value(raw, "\n")
     assert values == processed
+
+
+def read_case(bname):
+    with open(get_test_path(bname)) as src:
+        return src.read()
+
+
+@pytest.mark.parametrize("bname", ["vep_v77_01.txt", "vep_v97_with_empty.txt"])
+def test_parse_crlf(bname):
+    contents = read_case(bname)
+    crlf = StringIO(contents.replace("\n", "\r\n"))
+    assert parse(crlf) == parse(StringIO(contents))
+
+
+def test_parse_large_distribution():
+    header = read_case("vep_v97_with_empty.txt")
+    n_bins = 100_000
+    rows = "".join(f"{idx}\t{idx % 7}\n" for idx in range(n_bins))
+    name = "Distribution of variants on chromosome 1"
+    contents = f"{header}\n[{name}]\n{rows}\n[Variant classes]\nSNV\t448\n"
+    assert len(contents) > 1024 * 500
+    parsed = parse(StringIO(contents))
+    assert len(parsed[name]) == n_bins
+    assert parsed[name][-1] == (n_bins - 1) % 7
+    assert parsed["Variant classes"] == {"SNV": 448}
+
+
+def test_parse_empty_section_at_end():
+    contents = "[VEP run statistics]\nVEP version (API)\t97 (97)\n\n[SIFT summary]\n"
+    parsed = parse(StringIO(contents))
+    assert parsed["VEP run statistics"] == {"VEP version (API)": "97 (97)"}
+    assert parsed["SIFT summary"]["deleterious"] == 0